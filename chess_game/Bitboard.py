@@ -0,0 +1,294 @@
+class Bitboard:
+    """
+    Helpers for working with bitboards, 64 bit integers where each bit
+    repersents one square of the board (https://www.chessprogramming.org/Bitboards).
+
+    Bits are numbered the same way as GameState._squares, so the square at
+    position (x,y) is bit x + (y * 8). Bit 0 is a8 and bit 63 is h1, meaning
+    white pawns move towards the lower bits.
+
+    Piece types are indexed P=0, N=1, B=2, R=3, Q=4, K=5 and colours w=0, b=1.
+    The bitboard for a piece is at index (colour * 6) + type.
+
+    The *_attacks methods work on any number of pieces at once. The tables
+    below the class are worked out once at import and give the same answers
+    for a piece on one square as lookups (the *_from methods).
+    """
+    FULL = (1 << 64) - 1
+    FILE_A = 0x0101010101010101
+    FILE_H = FILE_A << 7
+    NOT_FILE_A = FULL ^ FILE_A
+    NOT_FILE_H = FULL ^ FILE_H
+    NOT_FILE_AB = NOT_FILE_A & (FULL ^ (FILE_A << 1))
+    NOT_FILE_GH = NOT_FILE_H & (FULL ^ (FILE_H >> 1))
+    RANK_8 = 0xFF
+    RANK_1 = RANK_8 << 56
+
+    # (shift, mask) for each direction a sliding piece can move in, masks
+    # stop pieces wrapping round from one side of the board to the other
+    ORTHOGONAL = ((-8, FULL), (8, FULL), (1, NOT_FILE_A), (-1, NOT_FILE_H))
+    DIAGONAL = ((-7, NOT_FILE_A), (-9, NOT_FILE_H),
+                (9, NOT_FILE_A), (7, NOT_FILE_H))
+
+    PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(6)
+    WHITE, BLACK = 0, 1
+    piece_letters = "PNBRQK"
+    positions = tuple((i & 7, i >> 3) for i in range(64))
+    # (dx, dy) of each direction on the board, the first four are the
+    # ORTHOGONAL directions and the last four the DIAGONAL ones, in order
+    DIRECTIONS = ((0, -1), (0, 1), (1, 0), (-1, 0),
+                  (1, -1), (-1, -1), (1, 1), (-1, 1))
+    ROOK_DIRECTIONS = (0, 1, 2, 3)
+    BISHOP_DIRECTIONS = (4, 5, 6, 7)
+    # whether each direction moves towards the higher bits
+    _increasing = (False, True, True, False, False, False, True, True)
+
+    # filled in below the class, all indexed by square
+    orthogonal_lines = ()
+    diagonal_lines = ()
+    # squares a knight or king on a square can move to, as tuples of square
+    # indexes and as bitboards
+    knight_targets = ()
+    king_targets = ()
+    knight_table = ()
+    king_table = ()
+    # squares attacked by a pawn on a square, indexed by colour then square
+    pawn_table = ()
+    # the squares from a square to the edge of the board in each direction,
+    # indexed by direction then square, as tuples of square indexes nearest
+    # first and as bitboards
+    ray_squares = ()
+    ray_table = ()
+
+    @staticmethod
+    def colour_index(colour: str) -> int:
+        """
+        Index of a colour
+
+        Parameters:
+            string colour - value from the set {"w","W","b","B"}
+        """
+        return 1 if colour.lower() == "b" else 0
+
+    @staticmethod
+    def square_index(position: tuple) -> int:
+        """
+        Parameters:
+            tuple position - a position in format (x,y) where (0 <= x,y <= 7)
+        """
+        return position[0] + (position[1] * 8)
+
+    @staticmethod
+    def square_position(index: int) -> tuple:
+        return (index & 7, index >> 3)
+
+    @staticmethod
+    def popcount(bb: int) -> int:
+        return bin(bb).count("1")
+
+    @staticmethod
+    def squares(bb: int):
+        """
+        Yields the index of every set bit, lowest first
+        """
+        while bb:
+            lsb = bb & -bb
+            yield lsb.bit_length() - 1
+            bb ^= lsb
+
+    @staticmethod
+    def lsb_index(bb: int) -> int:
+        return (bb & -bb).bit_length() - 1
+
+    # one step shifts, named after the direction on the board as white sees it
+    @staticmethod
+    def north(bb):
+        return bb >> 8
+
+    @staticmethod
+    def south(bb):
+        return (bb << 8) & Bitboard.FULL
+
+    @staticmethod
+    def east(bb):
+        return (bb << 1) & Bitboard.NOT_FILE_A
+
+    @staticmethod
+    def west(bb):
+        return (bb >> 1) & Bitboard.NOT_FILE_H
+
+    @staticmethod
+    def pawn_attacks(bb: int, colour_index: int) -> int:
+        """
+        Squares attacked by every pawn in 'bb' of a given colour
+        """
+        if colour_index == Bitboard.WHITE:
+            ahead = bb >> 8
+        else:
+            ahead = (bb << 8) & Bitboard.FULL
+        return (((ahead << 1) & Bitboard.NOT_FILE_A) |
+                ((ahead >> 1) & Bitboard.NOT_FILE_H))
+
+    @staticmethod
+    def knight_attacks(bb: int) -> int:
+        """
+        Squares attacked by every knight in 'bb'
+        """
+        l1 = (bb >> 1) & Bitboard.NOT_FILE_H
+        l2 = (bb >> 2) & Bitboard.NOT_FILE_GH
+        r1 = (bb << 1) & Bitboard.NOT_FILE_A
+        r2 = (bb << 2) & Bitboard.NOT_FILE_AB
+        h1 = l1 | r1
+        h2 = l2 | r2
+        return ((h1 << 16) | (h1 >> 16) | (h2 << 8) | (h2 >> 8)) & Bitboard.FULL
+
+    @staticmethod
+    def king_attacks(bb: int) -> int:
+        """
+        Squares attacked by every king in 'bb'
+        """
+        row = bb | ((bb << 1) & Bitboard.NOT_FILE_A) | (
+            (bb >> 1) & Bitboard.NOT_FILE_H)
+        return (row | (row << 8) | (row >> 8)) & Bitboard.FULL & ~bb
+
+    @staticmethod
+    def ray_attacks(bb: int, occupied: int, direction: tuple) -> int:
+        """
+        Squares attacked by sliding pieces in 'bb' in one direction, using a
+        Kogge-Stone occluded fill (https://www.chessprogramming.org/Kogge-Stone_Algorithm).
+        The first blocker is included.
+
+        Parameters:
+            int bb - the sliding pieces
+            int occupied - bitboard of occupied squares
+            tuple direction - (shift, mask) from Bitboard.ORTHOGONAL or
+                              Bitboard.DIAGONAL
+        """
+        shift, mask = direction
+        empty = (Bitboard.FULL ^ occupied) & mask
+        if shift > 0:
+            bb |= empty & (bb << shift)
+            empty &= (empty << shift)
+            bb |= empty & (bb << (2 * shift))
+            empty &= (empty << (2 * shift))
+            bb |= empty & (bb << (4 * shift))
+            return (bb << shift) & mask & Bitboard.FULL
+        shift = -shift
+        bb |= empty & (bb >> shift)
+        empty &= (empty >> shift)
+        bb |= empty & (bb >> (2 * shift))
+        empty &= (empty >> (2 * shift))
+        bb |= empty & (bb >> (4 * shift))
+        return (bb >> shift) & mask
+
+    @staticmethod
+    def ray_attacks_from(square: int, occupied: int, direction: int) -> int:
+        """
+        Squares attacked by a sliding piece on a square in one direction, the
+        first blocker is included
+
+        Parameters:
+            int square - index of the square
+            int occupied - bitboard of occupied squares
+            int direction - index into Bitboard.DIRECTIONS
+        """
+        rays = Bitboard.ray_table[direction]
+        ray = rays[square]
+        blockers = ray & occupied
+        if blockers:
+            if Bitboard._increasing[direction]:
+                ray ^= rays[(blockers & -blockers).bit_length() - 1]
+            else:
+                ray ^= rays[blockers.bit_length() - 1]
+        return ray
+
+    @staticmethod
+    def rook_attacks_from(square: int, occupied: int) -> int:
+        """
+        Squares attacked by a rook on a square given the occupied squares
+        """
+        ray = Bitboard.ray_attacks_from
+        return (ray(square, occupied, 0) | ray(square, occupied, 1) |
+                ray(square, occupied, 2) | ray(square, occupied, 3))
+
+    @staticmethod
+    def bishop_attacks_from(square: int, occupied: int) -> int:
+        """
+        Squares attacked by a bishop on a square given the occupied squares
+        """
+        ray = Bitboard.ray_attacks_from
+        return (ray(square, occupied, 4) | ray(square, occupied, 5) |
+                ray(square, occupied, 6) | ray(square, occupied, 7))
+
+    @staticmethod
+    def rook_attacks(bb: int, occupied: int) -> int:
+        """
+        Squares attacked by every rook (or queen) in 'bb' given the occupied
+        squares, the first blocker in each direction is included
+        """
+        ray = Bitboard.ray_attacks
+        north, south, east, west = Bitboard.ORTHOGONAL
+        return (ray(bb, occupied, north) | ray(bb, occupied, south) |
+                ray(bb, occupied, east) | ray(bb, occupied, west))
+
+    @staticmethod
+    def bishop_attacks(bb: int, occupied: int) -> int:
+        """
+        Squares attacked by every bishop (or queen) in 'bb' given the occupied
+        squares, the first blocker in each direction is included
+        """
+        ray = Bitboard.ray_attacks
+        ne, nw, se, sw = Bitboard.DIAGONAL
+        return (ray(bb, occupied, ne) | ray(bb, occupied, nw) |
+                ray(bb, occupied, se) | ray(bb, occupied, sw))
+
+
+# every square on the same rank and file as a square, and on the same
+# diagonals as a square (including the square itself)
+Bitboard.orthogonal_lines = tuple(
+    (0xFF << (i & ~7)) | (Bitboard.FILE_A << (i & 7)) for i in range(64))
+Bitboard.diagonal_lines = tuple(
+    sum(1 << j for j in range(64)
+        if (j & 7) - (j >> 3) == (i & 7) - (i >> 3) or
+        (j & 7) + (j >> 3) == (i & 7) + (i >> 3))
+    for i in range(64))
+
+
+def _targets(square, steps):
+    x, y = square & 7, square >> 3
+    return tuple((x + dx) + (y + dy) * 8 for dx, dy in steps
+                 if 0 <= x + dx <= 7 and 0 <= y + dy <= 7)
+
+
+def _ray(square, direction):
+    dx, dy = direction
+    x, y = (square & 7) + dx, (square >> 3) + dy
+    squares = []
+    while 0 <= x <= 7 and 0 <= y <= 7:
+        squares.append(x + y * 8)
+        x, y = x + dx, y + dy
+    return tuple(squares)
+
+
+def _to_bitboard(squares):
+    return sum(1 << square for square in squares)
+
+
+Bitboard.knight_targets = tuple(
+    _targets(i, ((-2, -1), (-2, 1), (2, -1), (2, 1),
+                 (-1, -2), (-1, 2), (1, -2), (1, 2))) for i in range(64))
+Bitboard.king_targets = tuple(
+    _targets(i, Bitboard.DIRECTIONS) for i in range(64))
+Bitboard.knight_table = tuple(
+    _to_bitboard(targets) for targets in Bitboard.knight_targets)
+Bitboard.king_table = tuple(
+    _to_bitboard(targets) for targets in Bitboard.king_targets)
+# white pawns move towards y = 0
+Bitboard.pawn_table = (
+    tuple(_to_bitboard(_targets(i, ((-1, -1), (1, -1)))) for i in range(64)),
+    tuple(_to_bitboard(_targets(i, ((-1, 1), (1, 1)))) for i in range(64)))
+Bitboard.ray_squares = tuple(
+    tuple(_ray(i, direction) for i in range(64))
+    for direction in Bitboard.DIRECTIONS)
+Bitboard.ray_table = tuple(
+    tuple(_to_bitboard(ray) for ray in rays) for rays in Bitboard.ray_squares)
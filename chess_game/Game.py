@@ -1,4 +1,6 @@
+from .Bitboard import Bitboard
 from .GameState import GameState
+from .MoveEncoding import MoveEncoding
 from .Move import Move, PromotionMove
 
 
@@ -31,19 +33,15 @@ class Game:
             "d" - draw
             ""  - game is not over
         """
-        # Other ways that the game can be over:
-        # Threefold repetition - position repeated three times in a game
-        # 50 move rule - no captures or pawn moves made in last 50 moves
-        stalemate = self.gamestate.stalemate()
-        if stalemate:
-            return "d"
-        white_checkmate = self.gamestate.checkmate("w")
-        black_checkmate = self.gamestate.checkmate("b")
-        if white_checkmate and not black_checkmate:
-            return "b"
-        elif black_checkmate and not white_checkmate:
-            return "w"
-        elif white_checkmate and black_checkmate:
+        # The gamestate finds draws by threefold repetition and the fifty
+        # move rule along with checkmate and stalemate. It caches the status
+        # for each position, so calling this every frame doesn't generate
+        # the moves every frame.
+        check, move_count, result = self.gamestate.get_status()
+        if result == "checkmate":
+            # the side to move has been checkmated
+            return "b" if self.player_to_play.lower() == "w" else "w"
+        elif result:
             return "d"
         else:
             return ""
@@ -83,11 +81,11 @@ class Game:
         return move_strings
 
     def possible_move_positions_for_piece(self, coord):
-        moves = [Move.from_algebraic_notation(
-            self.gamestate, self.player_to_play, move) for move in self.get_legal_moves()]
-        moves = [move for move in moves if (move.normal or
-                                            move.promotion) and move.position_from == coord]
-        return [move.position_to for move in moves]
+        # the gamestate keeps the legal moves by square until the next move
+        castling = (MoveEncoding.KING_CASTLE, MoveEncoding.QUEEN_CASTLE)
+        return [Bitboard.positions[code >> 6 & 63]
+                for code in self.gamestate.legal_moves_from(tuple(coord))
+                if code >> 12 not in castling]
 
     def get_previous_moves(self, colour: str):
         """
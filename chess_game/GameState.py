@@ -1,5 +1,10 @@
 from .Square import Square
 from .Pieces import Rook, Pawn, Bishop, King, Knight, Queen
+from .Bitboard import Bitboard
+from .MoveEncoding import MoveEncoding
+from .MoveGenerator import MoveGenerator
+from .Zobrist import Zobrist
+from .PieceSquareTables import PieceSquareTables
 
 
 class MoveStack:
@@ -57,32 +62,123 @@ class GameState:
     """
     The current state of the game including the pieces & the Moves already made
 
+    As well as the list of Square objects the position is stored as
+    bitboards, one per piece type and colour plus one per colour for
+    occupancy. Square.set_piece and Square.pop_piece keep them up to date so
+    queries can use bitwise operations rather than walking the squares.
+    They also keep a piece list for each piece type and colour and the
+    square of each king, so a side's pieces can be found without looking at
+    the squares they aren't on.
+
+    The position also has a Zobrist key (zobrist_key) which is updated as
+    pieces are added and removed and as the side to move, castling rights
+    and en passant square change, and a key of only its pawns (pawn_key).
+    The same goes for its material and piece-square score (score), so
+    evaluating a position costs nothing.
+
+    Moves can be made either as Move objects or, without creating any
+    objects, as MoveEncoding codes (as the search does). Both go on the same
+    move stack so undo_move undoes either.
+
     Methods:
         GameState(fen_string : string) (constructor) 
         _load_fen(fen_string: string)
         make_move(move: Move)
+        make_move_code(code: int)
+        undo_move()
         square_exists(position: tuple(x,y))
         square_is_empty(position: tuple(x,y))
+        get_pieces_by_colour(colour: str)
+        get_pieces(colour: str, piece_type: int)
+        king_square(colour: str)
+        get_status() - check, legal move count and result for the side to move
+        repetitions() - times the current position has been reached before
+        repetition_history() - keys of the positions it could repeat
+        legal_moves_from(position), legal_moves_to(position) - cached legal
+            move codes from or to a square
+        see(code) - material won or lost by a capture once the exchange on
+            its square is played out
     """
     _squares = []
+    _bitboards = []
+    _occupancy = []
+    _piece_lists = []
+    _king_squares = []
     _captured_pieces = []
     _moves = MoveStack()
     _player_to_play = "W"
+    _en_passant = None
+    _castling_rights = 0
+    _hash = 0
+    _pawn_hash = 0
+    _mg_score = 0
+    _eg_score = 0
+    _phase = 0
+    _state_history = []
+    _hash_history = []
+    _halfmove_clock = 0
+    _fullmove_number = 1
+    # ((zobrist key, halfmove clock, repetitions), status) of the last
+    # position get_status was called for, everything the status depends on
+    # so it stays right when moves are undone
+    _status_cache = None
+    # colour index -> ((zobrist key, ply count), (codes, codes by from
+    # square, codes by to square)) for the last position its legal moves
+    # were found in, the moves only depend on the position so the entry is
+    # still right when moves are undone
+    _legal_move_cache = {}
     piece_letters = {"r": Rook, "n": Knight,
                      "p": Pawn, "b": Bishop, "k": King, "q": Queen}
+    # castling rights are stored as a bitmask, K=1 Q=2 k=4 q=8
+    castling_letters = "KQkq"
+    # rights kept when a piece moves from or to a square, moving a king or a
+    # rook (or capturing a rook) loses the right to castle with it
+    _castling_masks = {60: 12, 63: 14, 56: 13, 4: 3, 7: 11, 0: 7}
+    # value of each piece type for static exchange evaluation, indexed like
+    # Bitboard
+    see_values = tuple(PieceSquareTables.piece_weights[letter]
+                       for letter in Bitboard.piece_letters)
 
     # _squares = [Square(0,0),Square(0,1),...,Square(1,0),Square(1,1),...,Square(2,0)]
 
-    def __init__(self, fen_string="rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR"):
+    def __init__(self, fen_string="rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR",
+                 hash_history=()):
         """
         Parameters:
             string fen_string - string in fen format or empty string to not
                                 generate a board of squares
+            list hash_history - zobrist keys of the positions before the one
+                                in the FEN string, from repetition_history(),
+                                so repetitions of them can be found
 
         """
         self._moves = MoveStack()
-        
-        print(len(self.moves.get_moves()))
+        self._bitboards = [0] * 12
+        self._occupancy = [0, 0]
+        # square index -> piece for each bitboard index
+        self._piece_lists = [{} for i in range(12)]
+        self._king_squares = [None, None]
+        self._hash = 0
+        # key made up of only the pawns, so pawn structure can be cached
+        self._pawn_hash = 0
+        # middlegame and endgame material and piece-square scores from
+        # white's point of view and the game phase, kept up to date as
+        # pieces are added and removed
+        self._mg_score = 0
+        self._eg_score = 0
+        self._phase = 0
+        # state that can't be recovered from a move when it is undone, one
+        # entry per move in the move stack of (en passant square, castling
+        # rights, captured piece, moved piece, halfmove clock), the pieces
+        # are only kept for moves made as codes
+        self._state_history = []
+        # the zobrist key of the position before each move in the move stack,
+        # after the keys of any positions before the loaded one
+        self._hash_history = list(hash_history)
+        self._halfmove_clock = 0
+        self._fullmove_number = 1
+        self._legal_move_cache = {}
+
         if fen_string:
             self._load_fen(fen_string)
 
@@ -95,6 +191,27 @@ class GameState:
         squares = [s for s in self._squares]
         copy._squares = [s.clone(copy) for s in squares]
         copy._moves = self._moves.clone()
+        copy._player_to_play = self._player_to_play
+        copy._en_passant = self._en_passant
+        copy._castling_rights = self._castling_rights
+        copy._hash = self._hash
+        # the pieces kept for moves made as codes must be the copy's own, so
+        # undoing a move on the copy doesn't move the original's pieces,
+        # pieces still on the board are matched by square and the rest cloned
+        pieces = {id(square.get_piece()): square_copy.get_piece()
+                  for square, square_copy in zip(self._squares, copy._squares)
+                  if square.get_piece()}
+        for state in self._state_history:
+            for piece in state[2:4]:
+                if piece is not None and id(piece) not in pieces:
+                    pieces[id(piece)] = piece.clone()
+        copy._state_history = [
+            state[:2] + tuple(None if piece is None else pieces[id(piece)]
+                              for piece in state[2:4]) + state[4:]
+            for state in self._state_history]
+        copy._hash_history = list(self._hash_history)
+        copy._halfmove_clock = self._halfmove_clock
+        copy._fullmove_number = self._fullmove_number
         return copy
 
     @property
@@ -109,11 +226,287 @@ class GameState:
     def player_to_play(self):
         return self._player_to_play
 
+    @property
+    def halfmove_clock(self) -> int:
+        """
+        The number of half moves since the last capture or pawn move
+        """
+        return self._halfmove_clock
+
+    @property
+    def zobrist_key(self) -> int:
+        """
+        64 bit key identifying the position, made up of the pieces, the side
+        to move, the castling rights and the en passant file
+        """
+        return self._hash
+
+    @property
+    def pawn_key(self) -> int:
+        """
+        64 bit key identifying the pawns of the position, changes only when
+        a pawn moves, is captured or promotes
+        """
+        return self._pawn_hash
+
+    @property
+    def score(self) -> int:
+        """
+        Material and piece-square score of the position from white's point of
+        view, tapered by the game phase (see PieceSquareTables)
+        """
+        return PieceSquareTables.taper(self._mg_score, self._eg_score,
+                                       self._phase)
+
+    @property
+    def castling_rights(self) -> int:
+        """
+        Bitmask of the castling rights still available, K=1 Q=2 k=4 q=8
+        """
+        return self._castling_rights
+
+    def has_castling_right(self, colour: str, side: str) -> bool:
+        """
+        Parameters:
+            string colour - value from the set {"w","W","b","B"}
+            string side - "k" for kingside or "q" for queenside
+        """
+        letter = side.upper() if colour.lower() == "w" else side.lower()
+        return bool(self._castling_rights &
+                    (1 << self.castling_letters.index(letter)))
+
+    def _set_castling_rights(self, rights: int):
+        self._hash ^= (Zobrist.castling_keys[self._castling_rights] ^
+                       Zobrist.castling_keys[rights])
+        self._castling_rights = rights
+
+    @property
+    def occupied(self) -> int:
+        """
+        Bitboard of every occupied square
+        """
+        return self._occupancy[0] | self._occupancy[1]
+
+    def get_bitboard(self, letter: str) -> int:
+        """
+        Gets the bitboard for a type of piece
+
+        Parameters:
+            string letter - piece letter, capitalised for white (like FEN)
+        """
+        index = Bitboard.piece_letters.index(letter.upper())
+        if letter.islower():
+            index += 6
+        return self._bitboards[index]
+
+    def _add_to_bitboards(self, piece, index: int):
+        """
+        Called by Square.set_piece, should not be called elsewhere
+        """
+        bit = 1 << index
+        bitboard_index = piece.bitboard_index
+        colour = 1 if bitboard_index >= 6 else 0
+        self._bitboards[bitboard_index] |= bit
+        self._occupancy[colour] |= bit
+        self._piece_lists[bitboard_index][index] = piece
+        if bitboard_index - 6 * colour == Bitboard.KING:
+            self._king_squares[colour] = index
+        table_index = bitboard_index * 64 + index
+        self._hash ^= Zobrist.piece_keys[table_index]
+        self._mg_score += PieceSquareTables.mg_values[table_index]
+        self._eg_score += PieceSquareTables.eg_values[table_index]
+        self._phase += PieceSquareTables.phase_values[bitboard_index]
+        if bitboard_index - 6 * colour == Bitboard.PAWN:
+            self._pawn_hash ^= Zobrist.piece_keys[table_index]
+
+    def _remove_from_bitboards(self, piece, index: int):
+        """
+        Called by Square.pop_piece, should not be called elsewhere
+        """
+        mask = ~(1 << index)
+        bitboard_index = piece.bitboard_index
+        colour = 1 if bitboard_index >= 6 else 0
+        self._bitboards[bitboard_index] &= mask
+        self._occupancy[colour] &= mask
+        del self._piece_lists[bitboard_index][index]
+        if self._king_squares[colour] == index:
+            self._king_squares[colour] = None
+        table_index = bitboard_index * 64 + index
+        self._hash ^= Zobrist.piece_keys[table_index]
+        self._mg_score -= PieceSquareTables.mg_values[table_index]
+        self._eg_score -= PieceSquareTables.eg_values[table_index]
+        self._phase -= PieceSquareTables.phase_values[bitboard_index]
+        if bitboard_index - 6 * colour == Bitboard.PAWN:
+            self._pawn_hash ^= Zobrist.piece_keys[table_index]
+
+    def attacked_squares(self, colour: str, occupied=None) -> int:
+        """
+        Returns a bitboard of every square attacked by a colour
+
+        Parameters:
+            string colour - value from the set {"w","W","b","B"}
+            int occupied - bitboard of occupied squares to use for sliding
+                           pieces, defaults to the current occupancy
+        """
+        if occupied is None:
+            occupied = self.occupied
+        c = Bitboard.colour_index(colour)
+        bbs = self._bitboards[c * 6: c * 6 + 6]
+        queens = bbs[Bitboard.QUEEN]
+        return (Bitboard.pawn_attacks(bbs[Bitboard.PAWN], c) |
+                Bitboard.knight_attacks(bbs[Bitboard.KNIGHT]) |
+                Bitboard.king_attacks(bbs[Bitboard.KING]) |
+                Bitboard.bishop_attacks(bbs[Bitboard.BISHOP] | queens, occupied) |
+                Bitboard.rook_attacks(bbs[Bitboard.ROOK] | queens, occupied))
+
     @player_to_play.setter
     def player_to_play(self, player):
         if player.lower() in ["w", "b"]:
+            if player.lower() != self._player_to_play.lower():
+                self._hash ^= Zobrist.black_to_move_key
             self._player_to_play = player
 
+    @property
+    def en_passant(self):
+        """
+        The position a pawn can move to to capture en passant (the square
+        behind a pawn that has just moved two squares) or None
+        """
+        return self._en_passant
+
+    @en_passant.setter
+    def en_passant(self, position):
+        if self._en_passant:
+            self._hash ^= Zobrist.en_passant_keys[self._en_passant[0]]
+        if position:
+            self._hash ^= Zobrist.en_passant_keys[position[0]]
+        self._en_passant = position
+
+    def is_square_attacked(self, position: tuple, colour: str) -> bool:
+        """
+        Returns whether a square is attacked by any piece of a colour. Looks
+        outwards from the square for knights, pawns, kings and sliding pieces
+        that could reach it rather than generating the colour's moves.
+
+        Parameters:
+            tuple position - a position in format (x,y) where (0 <= x,y <= 7)
+            string colour - the attacking colour, value from the set
+                            {"w","W","b","B"}
+        """
+        return self._is_attacked(position[0] + (position[1] * 8),
+                                 Bitboard.colour_index(colour), self.occupied)
+
+    def _is_attacked(self, index: int, them: int, occupied: int) -> bool:
+        """
+        is_square_attacked taking a square index, a colour index and the
+        occupied squares to use for sliding pieces
+        """
+        bbs = self._bitboards
+        base = them * 6
+        if Bitboard.knight_table[index] & bbs[base + Bitboard.KNIGHT]:
+            return True
+        # a pawn of the other colour on the square attacks the same squares
+        # that attack it
+        if Bitboard.pawn_table[1 - them][index] & bbs[base + Bitboard.PAWN]:
+            return True
+        if Bitboard.king_table[index] & bbs[base + Bitboard.KING]:
+            return True
+        # only look along the rays if there is a sliding piece on the line
+        queens = bbs[base + Bitboard.QUEEN]
+        rooks = (bbs[base + Bitboard.ROOK] | queens) & \
+            Bitboard.orthogonal_lines[index]
+        if rooks and Bitboard.rook_attacks_from(index, occupied) & rooks:
+            return True
+        bishops = (bbs[base + Bitboard.BISHOP] | queens) & \
+            Bitboard.diagonal_lines[index]
+        if bishops and Bitboard.bishop_attacks_from(index, occupied) & bishops:
+            return True
+        return False
+
+    def _attackers_to(self, index: int, them: int, occupied: int) -> int:
+        """
+        Bitboard of the pieces of colour index 'them' that attack a square
+        """
+        bbs = self._bitboards
+        base = them * 6
+        queens = bbs[base + Bitboard.QUEEN]
+        return ((Bitboard.knight_table[index] & bbs[base + Bitboard.KNIGHT]) |
+                (Bitboard.pawn_table[1 - them][index] &
+                 bbs[base + Bitboard.PAWN]) |
+                (Bitboard.king_table[index] & bbs[base + Bitboard.KING]) |
+                (Bitboard.rook_attacks_from(index, occupied) &
+                 (bbs[base + Bitboard.ROOK] | queens)) |
+                (Bitboard.bishop_attacks_from(index, occupied) &
+                 (bbs[base + Bitboard.BISHOP] | queens)))
+
+    def see(self, code: int) -> int:
+        """
+        Static exchange evaluation (https://www.chessprogramming.org/Static_Exchange_Evaluation)
+        of a move, the material the side moving wins (or loses if negative)
+        once both sides have recaptured on the square for as long as it gains
+        them anything. Each side recaptures with its least valuable attacker
+        and sliding pieces behind an attacker join in once it has captured.
+        Pins and promotions during the exchange are ignored, and the board is
+        not changed.
+
+        Parameters:
+            int code - MoveEncoding code of a move in the position
+        """
+        values = self.see_values
+        bbs = self._bitboards
+        from_index = code & 63
+        to_index = code >> 6 & 63
+        flags = code >> 12
+        occupied = self.occupied
+        attacker = self._squares[from_index]._piece._type_index
+        side = 1 if (1 << from_index) & self._occupancy[1] else 0
+
+        if flags == MoveEncoding.EN_PASSANT:
+            # the captured pawn is beside the square moved from
+            occupied ^= 1 << ((from_index & ~7) | (to_index & 7))
+            gains = [values[Bitboard.PAWN]]
+        elif flags & MoveEncoding.CAPTURE:
+            gains = [values[self._squares[to_index]._piece._type_index]]
+        else:
+            gains = [0]
+        if flags & MoveEncoding.PROMOTION:
+            attacker = MoveEncoding.promotion_type(code)
+            gains[0] += values[attacker] - values[Bitboard.PAWN]
+
+        occupied ^= 1 << from_index
+        attackers = (self._attackers_to(to_index, 0, occupied) |
+                     self._attackers_to(to_index, 1, occupied)) & occupied
+        diagonal_sliders = (bbs[Bitboard.BISHOP] | bbs[Bitboard.QUEEN] |
+                            bbs[Bitboard.BISHOP + 6] | bbs[Bitboard.QUEEN + 6])
+        orthogonal_sliders = (bbs[Bitboard.ROOK] | bbs[Bitboard.QUEEN] |
+                              bbs[Bitboard.ROOK + 6] | bbs[Bitboard.QUEEN + 6])
+        while True:
+            side = 1 - side
+            side_attackers = attackers & self._occupancy[side]
+            if not side_attackers:
+                break
+            for piece_type in range(6):
+                least_valuable = side_attackers & bbs[side * 6 + piece_type]
+                if least_valuable:
+                    break
+            # this side captures the last piece to capture on the square
+            gains.append(values[attacker] - gains[-1])
+            attacker = piece_type
+            occupied ^= least_valuable & -least_valuable
+            # pieces behind it on the same line can now reach the square
+            if piece_type in (Bitboard.PAWN, Bitboard.BISHOP, Bitboard.QUEEN):
+                attackers |= Bitboard.bishop_attacks_from(
+                    to_index, occupied) & diagonal_sliders
+            if piece_type in (Bitboard.ROOK, Bitboard.QUEEN):
+                attackers |= Bitboard.rook_attacks_from(
+                    to_index, occupied) & orthogonal_sliders
+            attackers &= occupied
+
+        # each side only captures if it gains from doing so
+        for depth in range(len(gains) - 1, 0, -1):
+            gains[depth - 1] = -max(-gains[depth - 1], gains[depth])
+        return gains[0]
+
     def check(self, colour: str) -> bool:
         """
         Returns a bool value repersenting wether the colour specified is in check
@@ -121,29 +514,45 @@ class GameState:
         Parameters
             string colour - value from the set {"w","W","b","B"}
         """
-        opposition_colour = ["B", "W"][["W", "B"].index(colour.upper())]
-        try:
-            opposition_king = [
-                s._piece for s in self._squares
-                if s._piece and s._piece.letter.lower() == "k"
-                and s._piece.colour.upper() == colour.upper()][0]
-            opposition_king_pos = opposition_king.position
-        except IndexError:
-            # self.print()
+        us = Bitboard.colour_index(colour)
+        king_square = self._king_squares[us]
+        if king_square is None:
             return True
 
-        # psuedolegal so it doesn't have to call game_state.check and get stuck
-        # in infinite loop
-        legal_moves = self.get_pseudolegal_moves(opposition_colour)
+        return self._is_attacked(king_square, 1 - us, self.occupied)
 
-        for move in legal_moves:
-            # if would capture king
-            try:
-                if move.position_to == opposition_king_pos:
-                    return True
-            except AttributeError:
-                pass
-        return False
+    def repetitions(self) -> int:
+        """
+        Returns the number of times the current position has been reached
+        before. Only the positions since the last capture or pawn move are
+        compared, as no earlier position can be reached again.
+        """
+        history = self._hash_history
+        key = self._hash
+        count = 0
+        # only positions with the same side to move can match
+        for i in range(len(history) - 4, len(history) - 1 -
+                       min(self._halfmove_clock, len(history)), -2):
+            if history[i] == key:
+                count += 1
+        return count
+
+    def repetition_history(self) -> list:
+        """
+        Returns the zobrist keys of the positions since the last capture or
+        pawn move, the only ones the current position can repeat. A GameState
+        loaded from this position's FEN string and given these keys finds the
+        same repetitions.
+        """
+        history = self._hash_history
+        return history[len(history) - min(self._halfmove_clock, len(history)):]
+
+    def is_repetition(self) -> bool:
+        """
+        Whether the current position has been reached before, which the
+        search treats as a draw
+        """
+        return self.repetitions() > 0
 
     def checkmate(self, colour: str) -> bool:
         """
@@ -155,8 +564,48 @@ class GameState:
         Return Value:
             bool checkmate - whether or not the colour is in checkmate
         """
+        if colour.upper() == self._player_to_play:
+            return self.get_status()[2] == "checkmate"
         return(len(self.get_legal_moves(colour)) == 0 and self.check(colour))
 
+    def get_status(self) -> tuple:
+        """
+        Returns a tuple of (check, legal move count, result) for the side to
+        move, worked out with one generation of its legal moves and kept
+        until the position changes
+
+            bool check - whether the side to move is in check
+            int legal move count - including underpromotions
+            string result - "checkmate", "stalemate", "fifty_move_rule",
+                            "threefold_repetition" or "" if the game isn't
+                            over
+        """
+        repetitions = self.repetitions()
+        key = (self._hash, self._halfmove_clock, repetitions)
+        cache = self._status_cache
+        if cache is not None and cache[0] == key:
+            return cache[1]
+
+        colour = self._player_to_play
+        check = self.check(colour)
+        codes = self._legal_move_index(colour)[0]
+        # the cached moves only promote to a Queen, each promotion could be
+        # to three other pieces
+        promotion = MoveEncoding.PROMOTION << 12
+        move_count = len(codes) + 3 * sum(
+            1 for code in codes if code & promotion)
+        if not move_count:
+            result = "checkmate" if check else "stalemate"
+        elif self._halfmove_clock >= 100:
+            result = "fifty_move_rule"
+        elif repetitions >= 2:
+            result = "threefold_repetition"
+        else:
+            result = ""
+        status = (check, move_count, result)
+        self._status_cache = (key, status)
+        return status
+
     def stalemate(self) -> bool:
         """
         Returns a bool value repersenting whther the board is in checkmate
@@ -165,25 +614,120 @@ class GameState:
             bool stalemate - whether or not the colour is in checkmate
         """
         for colour in ["w", "b"]:
-            if (len(self.get_legal_moves(colour)) == 0 and
+            if colour.upper() == self._player_to_play:
+                if self.get_status()[2] == "stalemate":
+                    return True
+            elif (len(self.get_legal_moves(colour)) == 0 and
                     not self.check(colour)):
                 return True
         else:
             return False
 
-    def get_legal_moves(self, colour: str, get_castling_moves=True):
+    def get_legal_moves(self, colour: str, get_castling_moves=True,
+                        get_underpromotions=False):
         """
         Gets legal moves for a given colour
 
         Parameters
             string colour - value from the set {"w","W","b","B"}
+            bool get_underpromotions - include promotions to pieces other
+                                       than a Queen
         """
-        pieces_of_colour = self.get_pieces_by_colour(colour)
-        legal_moves = []
-        for piece in pieces_of_colour:
-            legal_moves.extend(piece.get_legal_moves(
-                self, get_castling_moves=get_castling_moves))
-        return legal_moves
+        if get_castling_moves and not get_underpromotions:
+            decode = MoveEncoding.decode
+            return [decode(self, code)
+                    for code in self._legal_move_index(colour)[0]]
+        return MoveGenerator.legal_moves(
+            self, colour, get_castling_moves=get_castling_moves,
+            get_underpromotions=get_underpromotions)
+
+    def legal_moves_from(self, position: tuple, colour=None) -> list:
+        """
+        Gets the legal moves from a square as MoveEncoding codes, promotions
+        are only to a Queen
+
+        Parameters
+            tuple position - a position in format (x,y) where (0 <= x,y <= 7)
+            string colour - value from the set {"w","W","b","B"}, defaults to
+                            the player to play
+        """
+        return self._legal_move_index(colour or self._player_to_play)[1].get(
+            position[0] + (position[1] * 8), [])
+
+    def legal_moves_to(self, position: tuple, colour=None) -> list:
+        """
+        Gets the legal moves to a square as MoveEncoding codes, promotions
+        are only to a Queen and castling moves are to the king's square
+
+        Parameters
+            tuple position - a position in format (x,y) where (0 <= x,y <= 7)
+            string colour - value from the set {"w","W","b","B"}, defaults to
+                            the player to play
+        """
+        return self._legal_move_index(colour or self._player_to_play)[2].get(
+            position[0] + (position[1] * 8), [])
+
+    def _legal_move_index(self, colour: str) -> tuple:
+        """
+        Returns a tuple of (codes, codes by from square, codes by to square)
+        of a colour's legal moves in the current position. They are generated
+        once per position and kept until a colour's moves are asked for in
+        another position, so they can be asked for many times between two
+        moves and are still there after a reply is made and undone.
+        """
+        us = Bitboard.colour_index(colour)
+        key = (self._hash, len(self._state_history))
+        cached = self._legal_move_cache.get(us)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+        codes = MoveGenerator.legal_move_codes(self, colour)
+        by_from = {}
+        by_to = {}
+        for code in codes:
+            by_from.setdefault(code & 63, []).append(code)
+            by_to.setdefault(code >> 6 & 63, []).append(code)
+        index = (codes, by_from, by_to)
+        self._legal_move_cache[us] = (key, index)
+        return index
+
+    def get_captures(self, colour: str, get_underpromotions=False):
+        """
+        Gets the legal captures and promotions for a given colour
+
+        Parameters
+            string colour - value from the set {"w","W","b","B"}
+            bool get_underpromotions - include promotions to pieces other
+                                       than a Queen
+        """
+        return MoveGenerator.captures(
+            self, colour, get_underpromotions=get_underpromotions)
+
+    def get_legal_move_codes(self, colour: str, get_castling_moves=True,
+                             get_underpromotions=False):
+        """
+        Gets legal moves for a given colour as an array of MoveEncoding codes
+
+        Parameters
+            string colour - value from the set {"w","W","b","B"}
+            bool get_underpromotions - include promotions to pieces other
+                                       than a Queen
+        """
+        return MoveGenerator.legal_move_codes(
+            self, colour, get_castling_moves=get_castling_moves,
+            get_underpromotions=get_underpromotions)
+
+    def get_capture_codes(self, colour: str, get_underpromotions=False):
+        """
+        Gets the legal captures and promotions for a given colour as an array
+        of MoveEncoding codes
+
+        Parameters
+            string colour - value from the set {"w","W","b","B"}
+        """
+        return MoveGenerator.legal_move_codes(
+            self, colour, get_castling_moves=False,
+            get_underpromotions=get_underpromotions, captures_only=True)
 
     def get_pseudolegal_moves(self, colour: str, get_castling_moves=True):
         """
@@ -213,9 +757,20 @@ class GameState:
         """
         letter_lookup = self.piece_letters
         self._squares = []
+        self._bitboards = [0] * 12
+        self._occupancy = [0, 0]
+        self._piece_lists = [{} for i in range(12)]
+        self._king_squares = [None, None]
+        self._mg_score = 0
+        self._eg_score = 0
+        self._phase = 0
+        self._pawn_hash = 0
+        self._status_cache = None
+        self._legal_move_cache = {}
         number = 1
         # R1k5/7R/2Q3K1/8/8/6rq/PPPPPPPP/1NB2BNr b - - 0 1
-        ranks = fen_string.split(" ")[0].split("/")
+        fields = fen_string.split(" ")
+        ranks = fields[0].split("/")
 
         for rank_index in range(len(ranks)):
             squares = []
@@ -245,6 +800,47 @@ class GameState:
             # Adds the values from this rank to the _squares list
             self._squares.extend(squares)
 
+        self._player_to_play = "W"
+        if len(fields) > 1 and fields[1].lower() in ["w", "b"]:
+            self._player_to_play = fields[1].upper()
+
+        if len(fields) > 2:
+            self._castling_rights = sum(
+                1 << i for i, letter in enumerate(self.castling_letters)
+                if letter in fields[2])
+        else:
+            # no castling field so assume any king and rook that are in their
+            # starting positions can castle
+            self._castling_rights = 0
+            for i, (king, rook) in enumerate([((4, 7), (7, 7)), ((4, 7), (0, 7)),
+                                              ((4, 0), (7, 0)), ((4, 0), (0, 0))]):
+                letter = self.castling_letters[i]
+                king = self.get_square(king).get_piece()
+                rook = self.get_square(rook).get_piece()
+                if (king and rook and king.letter == ("K" if letter.isupper() else "k")
+                        and rook.letter == ("R" if letter.isupper() else "r")):
+                    self._castling_rights |= 1 << i
+
+        self._en_passant = None
+        if len(fields) > 3 and fields[3] != "-":
+            from .Move import BaseMove
+            position = BaseMove.coord_to_pos(fields[3])
+            # only kept if a pawn could take en passant, as when the double
+            # pawn push is made, so the zobrist key is the same either way
+            behind = Bitboard.square_index(position)
+            us = 0 if position[1] == 5 else 1
+            if Bitboard.pawn_attacks(1 << behind, us) & self._bitboards[
+                    Bitboard.PAWN + 6 * (1 - us)]:
+                self.en_passant = position
+
+        self._halfmove_clock = 0
+        self._fullmove_number = 1
+        if len(fields) > 5 and fields[4].isdigit() and fields[5].isdigit():
+            self._halfmove_clock = int(fields[4])
+            self._fullmove_number = max(1, int(fields[5]))
+
+        self._hash = Zobrist.hash(self)
+
     def print(self):
         """
         prints the board to the terminal **NOT** intended for use in final product
@@ -263,9 +859,13 @@ class GameState:
                 output_string += f"{self._squares[square].get_piece().letter} "
         print(output_string)
 
-    def generate_fen(self):
+    def generate_fen(self, include_clocks=False):
         """
         Generate fen of the current position
+
+        Parameters:
+            bool include_clocks - add the halfmove clock and fullmove number
+                                  fields
         """
         fen_str = ""
 
@@ -288,7 +888,20 @@ class GameState:
                 fen_str += str(counter)
             fen_str += "/"
 
-        return f"{fen_str[: -1]} {self._player_to_play.lower()}"
+        castling = "".join(
+            letter for i, letter in enumerate(self.castling_letters)
+            if self._castling_rights & (1 << i))
+        if self._en_passant:
+            from .Move import BaseMove
+            en_passant = BaseMove.pos_to_coord(self._en_passant)
+        else:
+            en_passant = "-"
+
+        fen_str = (f"{fen_str[: -1]} {self._player_to_play.lower()} "
+                   f"{castling if castling else '-'} {en_passant}")
+        if include_clocks:
+            fen_str += f" {self._halfmove_clock} {self._fullmove_number}"
+        return fen_str
 
     def make_move(self, move, check_legality=True):
         """
@@ -300,18 +913,157 @@ class GameState:
             raise Exception(
                 f"Invalid Move {(move.position_from,move.position_to)}")
 
+        # captures and pawn moves can't be undone so reset the clock
+        irreversible = (not move.castling and (
+            not self.square_is_empty(move.position_to) or
+            self.get_square(move.position_from).get_piece()._type_index ==
+            Bitboard.PAWN))
+        self._state_history.append(
+            (self._en_passant, self._castling_rights, None, None,
+             self._halfmove_clock))
+        self._hash_history.append(self._hash)
+        self._halfmove_clock = 0 if irreversible else self._halfmove_clock + 1
+        self.en_passant = None
         try:
             move.perform()
         except Exception as e:
             print([m.print() for m in self.get_legal_moves("b")])
 
+        rights = self._castling_rights
+        if rights:
+            masks = self._castling_masks
+            rights &= masks.get(Bitboard.square_index(move.position_from), 15)
+            if not move.castling:
+                rights &= masks.get(Bitboard.square_index(move.position_to), 15)
+            if rights != self._castling_rights:
+                self._set_castling_rights(rights)
+
         self._moves.push(move)
+        if self._player_to_play == "B":
+            self._fullmove_number += 1
+        self._player_to_play = ["B", "W"][[
+            "W", "B"].index(self._player_to_play)]
+        self._hash ^= Zobrist.black_to_move_key
+
+    def make_move_code(self, code: int):
+        """
+        Play a move given as a MoveEncoding code, the move must be legal as it
+        isn't checked
+
+        Parameters:
+            int code - the encoded move
+        """
+        from_sq = code & 63
+        to_sq = code >> 6 & 63
+        flags = code >> 12
+        squares = self._squares
+        position_to = Bitboard.positions[to_sq]
+        state = (self._en_passant, self._castling_rights)
+        self._hash_history.append(self._hash)
+        if self._en_passant:
+            self.en_passant = None
+
+        piece = squares[from_sq].pop_piece()
+        captured = None
+        if flags == MoveEncoding.EN_PASSANT:
+            captured = squares[(from_sq & 56) | (to_sq & 7)].pop_piece()
+        elif flags & MoveEncoding.CAPTURE:
+            captured = squares[to_sq].pop_piece()
+        moved = piece
+        if flags & MoveEncoding.PROMOTION:
+            moved = MoveEncoding.promotion_class(code)(
+                piece.number, position_to, piece.colour,
+                move_count=piece.move_count)
+        moved.make_move(position_to)
+        squares[to_sq].set_piece(moved)
+
+        if flags in (MoveEncoding.KING_CASTLE, MoveEncoding.QUEEN_CASTLE):
+            rook_from, rook_to = ((to_sq + 1, to_sq - 1)
+                                  if flags == MoveEncoding.KING_CASTLE
+                                  else (to_sq - 2, to_sq + 1))
+            rook = squares[rook_from].pop_piece()
+            rook.make_move(Bitboard.positions[rook_to])
+            squares[rook_to].set_piece(rook)
+        elif flags == MoveEncoding.DOUBLE_PAWN_PUSH:
+            # only recorded if a pawn could take en passant, as in Move
+            behind = (from_sq + to_sq) >> 1
+            us = 0 if from_sq > to_sq else 1
+            if Bitboard.pawn_attacks(1 << behind, us) & self._bitboards[
+                    Bitboard.PAWN + 6 * (1 - us)]:
+                self.en_passant = Bitboard.positions[behind]
+
+        rights = self._castling_rights
+        if rights:
+            masks = self._castling_masks
+            rights &= masks.get(from_sq, 15) & masks.get(to_sq, 15)
+            if rights != self._castling_rights:
+                self._set_castling_rights(rights)
+
+        self._state_history.append(
+            state + (captured, piece, self._halfmove_clock))
+        if captured or piece._type_index == Bitboard.PAWN:
+            self._halfmove_clock = 0
+        else:
+            self._halfmove_clock += 1
+        self._moves.push(code)
+        if self._player_to_play == "B":
+            self._fullmove_number += 1
         self._player_to_play = ["B", "W"][[
             "W", "B"].index(self._player_to_play)]
+        self._hash ^= Zobrist.black_to_move_key
+
+    def _unmake_move_code(self, code: int):
+        """
+        Puts the pieces back for the last move, made with make_move_code
+        """
+        from_sq = code & 63
+        to_sq = code >> 6 & 63
+        flags = code >> 12
+        squares = self._squares
+        captured, piece = self._state_history[-1][2:4]
+
+        moved = squares[to_sq].pop_piece()
+        if flags in (MoveEncoding.KING_CASTLE, MoveEncoding.QUEEN_CASTLE):
+            rook_from, rook_to = ((to_sq + 1, to_sq - 1)
+                                  if flags == MoveEncoding.KING_CASTLE
+                                  else (to_sq - 2, to_sq + 1))
+            rook = squares[rook_to].pop_piece()
+            rook.forget_move()
+            squares[rook_from].set_piece(rook)
+        if not flags & MoveEncoding.PROMOTION:
+            moved.forget_move()
+        squares[from_sq].set_piece(piece)
+        if captured:
+            if flags == MoveEncoding.EN_PASSANT:
+                squares[(from_sq & 56) | (to_sq & 7)].set_piece(captured)
+            else:
+                squares[to_sq].set_piece(captured)
 
     def undo_move(self):
-        move = self._moves.pop()
-        move.unperform()
+        """
+        Undo the last move played, restoring the GameState to exactly how it
+        was before the move was made. Returns the move, which is a code if it
+        was made with make_move_code.
+        """
+        move = self._moves.peek()
+        if move is None:
+            return None
+        if type(move) == int:
+            self._unmake_move_code(move)
+        else:
+            move.unperform()
+        self._moves.pop()
+        state = self._state_history.pop()
+        self._hash_history.pop()
+        self.en_passant = state[0]
+        self._set_castling_rights(state[1])
+        self._halfmove_clock = state[4]
+        self._player_to_play = ["B", "W"][[
+            "W", "B"].index(self._player_to_play)]
+        if self._player_to_play == "B":
+            self._fullmove_number -= 1
+        self._hash ^= Zobrist.black_to_move_key
+        return move
 
     def get_pieces_by_colour(self, colour: str):
         """
@@ -320,9 +1072,30 @@ class GameState:
         Parameters
             string colour - value from the set {"w","W","b","B"}
         """
-        return [
-            s._piece for s in self._squares if s._piece and
-            s._piece.colour.upper() == colour.upper()]
+        first = Bitboard.colour_index(colour) * 6
+        return [piece for pieces in self._piece_lists[first:first + 6]
+                for piece in pieces.values()]
+
+    def get_pieces(self, colour: str, piece_type: int) -> list:
+        """
+        Gets the pieces of a given colour and type
+
+        Parameters
+            string colour - value from the set {"w","W","b","B"}
+            int piece_type - Bitboard piece type (Bitboard.PAWN ...)
+        """
+        return list(self._piece_lists[
+            Bitboard.colour_index(colour) * 6 + piece_type].values())
+
+    def king_square(self, colour: str):
+        """
+        Returns the square index (x + 8 * y) of a colour's king or None if
+        it has no king
+
+        Parameters
+            string colour - value from the set {"w","W","b","B"}
+        """
+        return self._king_squares[Bitboard.colour_index(colour)]
 
     def get_square(self, position: tuple):
         """
@@ -358,4 +1131,4 @@ class GameState:
             tuple position - a position in format (x,y) where (0 <= x,y <= 7)
         """
         square_index = position[1]*8 + position[0]
-        return not bool(self._squares[square_index]._piece)
+        return not (self._occupancy[0] | self._occupancy[1]) >> square_index & 1
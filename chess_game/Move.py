@@ -1,4 +1,6 @@
 from . import GameState
+from .Bitboard import Bitboard
+from .MoveEncoding import MoveEncoding
 
 
 class BaseMove:
@@ -80,92 +82,124 @@ class BaseMove:
     @staticmethod
     def from_algebraic_notation(gamestate, colour_moving, algebraic_move):
         """
-        returns a Move formulated from an algebraic notation
-        """
-        # This is the worst function I have ever written
-        piece_letters = ["R", "N", "P", "B", "K", "Q"]
-
-        def get_king(colour):
-            king = [p for p in gamestate.get_pieces_by_colour(colour)
-                    if p.letter.upper() == "K"][0]
-            return king
+        returns a Move formulated from an algebraic notation, either SAN
+        (Nf3, exd5, e8=Q, O-O) or the long form made by to_algebraic_notation
+        (Ng1f3, Pe7e8=Q), or None if it isn't a single legal move
 
+        The moves are looked up in the gamestate's legal moves by the square
+        they go to, so parsing several moves in the same position only
+        generates the moves once.
+        """
         if not algebraic_move:
             return None
 
         # ignore captures and checks as not relevant or helpful
         algebraic_move = "".join(
-            [char for char in algebraic_move if char != "+" and char != "x"])
+            [char for char in algebraic_move.strip() if char not in "+#x"])
+        if not algebraic_move:
+            return None
+
+        if algebraic_move in ("O-O", "O-O-O", "0-0", "0-0-0"):
+            king_square = gamestate.king_square(colour_moving)
+            if king_square is None:
+                return None
+            return CastlingMove(gamestate, Bitboard.positions[king_square],
+                                "k" if len(algebraic_move) == 3 else "q")
 
         # if no piece is stated then a pawn is moving
         if algebraic_move[0] in BaseMove.file_values:
             algebraic_move = "P" + algebraic_move
 
         # denotes a promotion move
+        promote_to = None
         if "=" in algebraic_move:
-            # pos = algebraic_move[-2:]
-            # coord = BaseMove.coord_to_pos(pos)
-            # splice = algebraic_move[1:-2]
-            promote_to_letter = algebraic_move[-1]
-            promote_to = GameState.GameState.piece_letters[promote_to_letter.lower(
-            )]
-            algebraic_move = algebraic_move.split("=")[0]
-            # return PromotionMove(gamestate, coord, promote_to=promote_to_class)
-
-        if algebraic_move[0] in piece_letters:
-            coord = BaseMove.coord_to_pos(algebraic_move[-2:])
-            if not coord:
+            algebraic_move, promote_to_letter = algebraic_move.split("=", 1)
+            promote_to = GameState.GameState.piece_letters.get(
+                promote_to_letter.lower())
+            if (promote_to is None or promote_to._type_index not in
+                    MoveEncoding.promotion_flags):
                 return None
-            possible_moves = [
-                m for m in gamestate.get_legal_moves(colour_moving)
-                if (type(m) == Move or type(m) == PromotionMove) and
-                m.position_to == coord
-                and gamestate.get_square(m.position_from).get_piece().letter.upper() == algebraic_move[0]]
-            if len(possible_moves) >= 1:
-                splice = algebraic_move[1:-2]
-                if len(splice) == 2:
-                    possible_moves = [
-                        m for m in possible_moves if m.position_from == BaseMove.coord_to_pos(splice)]
-                    if len(possible_moves) != 1:
-                        return None
-                    else:
-                        return possible_moves[0]
-                elif len(splice) == 0:
-                    if len(possible_moves) != 1:
-                        return None
-                    else:
-                        return possible_moves[0]
-                elif len(splice) == 1:
-                    possible_moves_cpy = list(possible_moves)
-                    possible_moves = []
-                    if splice in BaseMove.file_values:
-                        for m in possible_moves_cpy:
-                            if m.position_from[0] == BaseMove.file_values.index(splice):
-                                possible_moves.append(m)
-
-                        if len(possible_moves) != 1:
-                            return None
-                        else:
-                            return possible_moves[0]
-                    if splice in Move.rank_values:
-                        for m in possible_moves_cpy:
-                            if m.position_from[1] == Move.rank_values.index(splice):
-                                possible_moves.append(m)
-                        if len(possible_moves) != 1:
-                            return None
-                        else:
-                            return possible_moves[0]
-                else:
-                    return None
-
-        elif algebraic_move.strip() == "O-O":
-            king = get_king(colour_moving)
-            return CastlingMove(gamestate, king.position, "k")
-        elif algebraic_move.strip() == "O-O-O":
-            king = get_king(colour_moving)
-            return CastlingMove(gamestate, king.position, "q")
-        else:
-            pass
+
+        piece_type = Bitboard.piece_letters.find(algebraic_move[0])
+        coord = BaseMove.coord_to_pos(algebraic_move[-2:])
+        if piece_type == -1 or not coord:
+            return None
+        # the square, file or rank the piece moves from if it is given
+        splice = algebraic_move[1:-2]
+        from_position = None
+        if len(splice) == 2:
+            from_position = BaseMove.coord_to_pos(splice)
+            if not from_position:
+                return None
+        elif len(splice) == 1:
+            if splice in BaseMove.file_values:
+                from_position = (BaseMove.file_values.index(splice), None)
+            elif splice in BaseMove.rank_values:
+                from_position = (None, BaseMove.rank_values.index(splice))
+            else:
+                return None
+        elif splice:
+            return None
+
+        squares = gamestate._squares
+        castling = (MoveEncoding.KING_CASTLE, MoveEncoding.QUEEN_CASTLE)
+        found = None
+        for code in gamestate.legal_moves_to(coord, colour_moving):
+            from_square = code & 63
+            if (code >> 12 in castling or
+                    squares[from_square]._piece._type_index != piece_type):
+                continue
+            if from_position and (
+                    from_position[0] not in (None, from_square & 7) or
+                    from_position[1] not in (None, from_square >> 3)):
+                continue
+            if found is not None:
+                # ambiguous
+                return None
+            found = code
+        if found is None:
+            return None
+
+        if (promote_to and found >> 12 & MoveEncoding.PROMOTION and
+                promote_to._type_index != Bitboard.QUEEN):
+            return PromotionMove(gamestate, Bitboard.positions[found & 63],
+                                 coord, promote_to=promote_to)
+        return MoveEncoding.decode(gamestate, found)
+
+    @staticmethod
+    def from_algebraic_notation_list(gamestate, algebraic_moves,
+                                     keep_moves=True):
+        """
+        Parses a list of moves in algebraic notation, each against the
+        position after the moves before it, and returns the list of moves.
+        The moves are made on the gamestate as they are parsed, each position
+        only has its legal moves generated once so a whole game is parsed in
+        linear time.
+
+        Parameters:
+            GameState gamestate - the position before the first move
+            list algebraic_moves - the moves in the order they are played,
+                                   starting with the player to play
+            bool keep_moves - whether to leave the moves made, otherwise the
+                              gamestate is put back as it was
+        """
+        moves = []
+        try:
+            for algebraic_move in algebraic_moves:
+                move = BaseMove.from_algebraic_notation(
+                    gamestate, gamestate.player_to_play, algebraic_move)
+                if not move or not move.is_legal_move():
+                    raise Exception(f"Invalid Move {algebraic_move}")
+                gamestate.make_move(move, check_legality=False)
+                moves.append(move)
+        except Exception:
+            for move in moves:
+                gamestate.undo_move()
+            raise
+        if not keep_moves:
+            for move in moves:
+                gamestate.undo_move()
+        return moves
 
 
 class Move(BaseMove):
@@ -184,7 +218,8 @@ class Move(BaseMove):
         print(f"Move - {self.position_from} -> {self.position_to}")
 
     def clone(self):
-        return Move(self.gamestate, self.position_from, self.position_to)
+        return Move(self.gamestate, self.position_from, self.position_to,
+                    en_passant=self.en_passant)
 
     @ property
     def captured(self):
@@ -195,37 +230,60 @@ class Move(BaseMove):
         self._captured_piece = piece
 
     def is_legal_move(self):
-        square_from = self._gamestate.get_square(self.position_from)
-        piece = square_from.get_piece()
-        square_to = self._gamestate.get_square(self.position_to)
-        formated_moves = [(m.position_from, m.position_to)
-                          for m in self.gamestate.get_legal_moves(piece.colour) 
-                          if m.normal]
-        return ((square_from.position, square_to.position) in formated_moves)
+        piece = self._gamestate.get_square(self.position_from).get_piece()
+        if not piece:
+            return False
+        to_square = Bitboard.square_index(self.position_to)
+        for code in self._gamestate.legal_moves_from(self.position_from,
+                                                     piece.colour):
+            flags = code >> 12
+            # castling and promotions are made with their own classes
+            if (code >> 6 & 63 == to_square and
+                    not flags & MoveEncoding.PROMOTION and
+                    flags not in (MoveEncoding.KING_CASTLE,
+                                  MoveEncoding.QUEEN_CASTLE)):
+                return True
+        return False
 
     def perform(self):
         square_from = self._gamestate.get_square(self.position_from)
         square_to = self._gamestate.get_square(self.position_to)
         move_to = square_to
         if self.en_passant:
-            print("making enpassant move")
             square_to = self.gamestate.get_square(self.en_passant)
         piece = square_from.pop_piece()
+        self._captured_piece = None
         if not self._gamestate.square_is_empty(square_to.position):
             captured_piece = square_to.pop_piece()
             self._captured_piece = (captured_piece)
         piece.make_move(move_to.position)
         move_to.set_piece(piece)
 
+        # a pawn moving two squares can be taken en passant on the next move,
+        # only recorded if there is a pawn that could take it so that
+        # positions that are the same have the same zobrist key
+        if (piece.letter.lower() == "p" and
+                abs(self.position_to[1] - self.position_from[1]) == 2):
+            behind = (self.position_to[0],
+                      (self.position_to[1] + self.position_from[1]) // 2)
+            us = Bitboard.colour_index(piece.colour)
+            enemy_pawns = self._gamestate._bitboards[
+                Bitboard.PAWN + 6 * (1 - us)]
+            if Bitboard.pawn_attacks(
+                    1 << Bitboard.square_index(behind), us) & enemy_pawns:
+                self._gamestate.en_passant = behind
+
     def _unperform(self):
-        square_from = self.get_square(self.position_from)
-        square_to = self.get_square(self.position_to)
+        square_from = self._gamestate.get_square(self.position_from)
+        square_to = self._gamestate.get_square(self.position_to)
         piece = square_to.pop_piece()
-        if self.en_passant:
-            en_passant = self.get_square(self.en_passant)
-            en_passant.set_piece(self.captured)
         if self.captured:
-            square_to.set_piece(self.captured)
+            if self.en_passant:
+                self._gamestate.get_square(
+                    self.en_passant).set_piece(self.captured)
+            else:
+                square_to.set_piece(self.captured)
+            self._captured_piece = None
         piece.forget_move()
         square_from.set_piece(piece)
 
@@ -275,12 +333,14 @@ class CastlingMove(BaseMove):
         return CastlingMove(self.gamestate, self.king_position, self.side)
 
     def is_legal_move(self):
-        # print(self.king_position)
-        square = self._gamestate.get_square(self.king_position)
-        piece = square.get_piece()
-        formated_moves = [(m.king_position, m.side)
-                          for m in [p for p in piece.get_legal_moves(self._gamestate) if p.castling]]
-        return ((square.position, self.side) in formated_moves)
+        piece = self._gamestate.get_square(self.king_position).get_piece()
+        if not piece:
+            return False
+        flags = (MoveEncoding.KING_CASTLE if self.side.lower() == "k"
+                 else MoveEncoding.QUEEN_CASTLE)
+        return any(code >> 12 == flags for code in
+                   self._gamestate.legal_moves_from(self.king_position,
+                                                    piece.colour))
 
     def print(self):
         print(f"CastlingMoves - {self.king_position} {self.side}")
@@ -288,30 +348,24 @@ class CastlingMove(BaseMove):
     def perform(self):
         king_from_square = self._gamestate.get_square(self._king_pos)
         rook_from_square = self._gamestate.get_square(self._rook_from_pos)
-        king = king_from_square.get_piece()
-        rook = rook_from_square.get_piece()
+        king = king_from_square.pop_piece()
+        rook = rook_from_square.pop_piece()
 
-        king_to_square = self._gamestate.get_square(self._king_to_pos)
-        king_to_square.set_piece(king)
-        rook_to_square = self._gamestate.get_square(self._rook_to_pos)
-        rook_to_square.set_piece(rook)
-
-        king_from_square.pop_piece()
-        rook_from_square.pop_piece()
+        king.make_move(self._king_to_pos)
+        rook.make_move(self._rook_to_pos)
+        self._gamestate.get_square(self._king_to_pos).set_piece(king)
+        self._gamestate.get_square(self._rook_to_pos).set_piece(rook)
 
     def _unperform(self):
         king_to_square = self._gamestate.get_square(self._king_to_pos)
         rook_to_square = self._gamestate.get_square(self._rook_to_pos)
-        king = king_to_square.get_piece()
-        rook = rook_to_square.get_piece()
+        king = king_to_square.pop_piece()
+        rook = rook_to_square.pop_piece()
 
-        king_from_square = self._gamestate.get_square(self.king_pos)
-        king_from_square.set_piece(king)
-        rook_from_square = self._gamestate.get_square(self.rook_from_pos)
-        rook_from_square.set_piece(rook)
-
-        king_to_square.pop_piece()
-        rook_to_square.pop_piece()
+        king.forget_move()
+        rook.forget_move()
+        self._gamestate.get_square(self._king_pos).set_piece(king)
+        self._gamestate.get_square(self._rook_from_pos).set_piece(rook)
 
     @ property
     def position_from(self):
@@ -348,6 +402,7 @@ class CastlingMove(BaseMove):
 class PromotionMove(BaseMove):
     _promote_to = None
     _promote_from = None
+    _piece_from = None
     _captured_piece = None
     _position = (-1, -1)
 
@@ -366,10 +421,10 @@ class PromotionMove(BaseMove):
         piece = self.gamestate.get_square(self.position_from).get_piece()
         if not piece:
             return False
-        formated_moves = [(m.position_from, m.position_to)
-                          for m in self.gamestate.get_legal_moves(piece.colour)]
-        print(formated_moves)
-        return ((self.position_from, self.position_to) in formated_moves)
+        to_square = Bitboard.square_index(self.position_to)
+        return any(code >> 6 & 63 == to_square for code in
+                   self.gamestate.legal_moves_from(self.position_from,
+                                                   piece.colour))
 
     def print(self):
         print(
@@ -379,6 +434,7 @@ class PromotionMove(BaseMove):
         square_from = self._gamestate.get_square(self.position_from)
         square_to = self._gamestate.get_square(self.position_to)
         piece_from = square_from.pop_piece()
+        self._captured_piece = None
         if not self._gamestate.square_is_empty(square_to.position):
             captured_piece = square_to.pop_piece()
             self._captured_piece = (captured_piece)
@@ -390,17 +446,18 @@ class PromotionMove(BaseMove):
             piece_from.number, square_to.position, piece_from.colour, move_count=piece_from.move_count)
         piece_to.make_move(square_to.position)
         square_to.set_piece(piece_to)
+        # kept so that the pawn itself can be put back when undone
+        self._piece_from = piece_from
 
     def _unperform(self):
         square_from = self._gamestate.get_square(self.position_from)
         square_to = self._gamestate.get_square(self.position_to)
-        piece_from = square_to.pop_piece()  # new piece
+        square_to.pop_piece()  # the piece promoted to
         if self.captured:
             square_to.set_piece(self.captured)
-        piece_to = self._promote_from(
-            square_from.position, self.piece_to.colour, move_count=self.piece_to.move_count)
-        piece_to.forget_move()
-        square_to.set_piece(piece_to)
+            self._captured_piece = None
+        square_from.set_piece(self._piece_from)
+        self._piece_from = None
 
     @ property
     def captured(self):
@@ -434,7 +491,7 @@ class PromotionMove(BaseMove):
 
     def to_algebraic_notation(self):
         if self.promote_to:
-            return f"P{self.pos_to_coord(self.position_from)}{self.pos_to_coord(self.position_to)}={promote_to.letter.upper()}"
+            return f"P{self.pos_to_coord(self.position_from)}{self.pos_to_coord(self.position_to)}={self.promote_to._letter}"
         else:
             # assumes promotion to a Queen because you have to promote to
             # something to denote a promotion move
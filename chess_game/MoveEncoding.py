@@ -0,0 +1,150 @@
+from .Bitboard import Bitboard
+
+
+class MoveEncoding:
+    """
+    Moves encoded as 16 bit ints (https://www.chessprogramming.org/Encoding_Moves)
+    so that move lists can be kept in array("H") buffers and the search can
+    make and undo moves without creating Move objects.
+
+        bits 0-5 from square index
+        bits 6-11 to square index (the king's square when castling)
+        bits 12-15 flags
+
+    Flags:
+        QUIET, DOUBLE_PAWN_PUSH, KING_CASTLE, QUEEN_CASTLE
+        CAPTURE (4) set for every capture, EN_PASSANT is a capture
+        PROMOTION (8) set for every promotion, the low two bits are the piece
+        promoted to, 0 Knight, 1 Bishop, 2 Rook, 3 Queen
+
+    Move objects are only made at the edges of the program with decode, and
+    encode turns a Move back into its code.
+    """
+    QUIET = 0
+    DOUBLE_PAWN_PUSH = 1
+    KING_CASTLE = 2
+    QUEEN_CASTLE = 3
+    CAPTURE = 4
+    EN_PASSANT = 5
+    PROMOTION = 8
+    QUEEN_PROMOTION = PROMOTION | 3
+    # flag bits for the piece promoted to, indexed by Bitboard piece type
+    promotion_flags = {Bitboard.KNIGHT: 0, Bitboard.BISHOP: 1,
+                       Bitboard.ROOK: 2, Bitboard.QUEEN: 3}
+
+    @staticmethod
+    def encode(from_square: int, to_square: int, flags=0) -> int:
+        return from_square | to_square << 6 | flags << 12
+
+    @staticmethod
+    def from_square(code: int) -> int:
+        return code & 63
+
+    @staticmethod
+    def to_square(code: int) -> int:
+        return code >> 6 & 63
+
+    @staticmethod
+    def flags(code: int) -> int:
+        return code >> 12
+
+    @staticmethod
+    def is_capture(code: int) -> bool:
+        return bool(code >> 12 & MoveEncoding.CAPTURE)
+
+    @staticmethod
+    def is_promotion(code: int) -> bool:
+        return bool(code >> 12 & MoveEncoding.PROMOTION)
+
+    @staticmethod
+    def promotion_type(code: int) -> int:
+        """
+        The Bitboard piece type promoted to, only for promotions
+        """
+        return (code >> 12 & 3) + Bitboard.KNIGHT
+
+    @staticmethod
+    def promotion_class(code: int):
+        """
+        The class of the piece promoted to, only for promotions
+        """
+        # Pieces imports GameState which imports this module
+        from . import Pieces
+        return (Pieces.Knight, Pieces.Bishop,
+                Pieces.Rook, Pieces.Queen)[code >> 12 & 3]
+
+    @staticmethod
+    def encode_move(move) -> int:
+        """
+        Returns the code of a Move, PromotionMove or CastlingMove, must be
+        called before the move is made as captures are found from the board
+        """
+        gamestate = move.gamestate
+        if move.castling:
+            from_square = Bitboard.square_index(move.king_position)
+            to_square = Bitboard.square_index(move._king_to_pos)
+            flags = (MoveEncoding.KING_CASTLE if move.side.lower() == "k"
+                     else MoveEncoding.QUEEN_CASTLE)
+            return MoveEncoding.encode(from_square, to_square, flags)
+
+        from_square = Bitboard.square_index(move.position_from)
+        to_square = Bitboard.square_index(move.position_to)
+        capture = (MoveEncoding.CAPTURE if not gamestate.square_is_empty(
+            move.position_to) else 0)
+        if move.promotion:
+            promote_to = move.promote_to
+            piece_type = (promote_to._type_index if promote_to
+                          else Bitboard.QUEEN)
+            flags = (MoveEncoding.PROMOTION | capture |
+                     MoveEncoding.promotion_flags[piece_type])
+        elif move.en_passant:
+            flags = MoveEncoding.EN_PASSANT
+        elif (abs(to_square - from_square) == 16 and
+              move.moving_piece._type_index == Bitboard.PAWN):
+            flags = MoveEncoding.DOUBLE_PAWN_PUSH
+        else:
+            flags = capture
+        return MoveEncoding.encode(from_square, to_square, flags)
+
+    @staticmethod
+    def decode(gamestate, code: int):
+        """
+        Returns the Move, PromotionMove or CastlingMove for a code in the
+        current position of a GameState
+
+        Parameters:
+            GameState gamestate - the position the move is played in
+            int code - the encoded move
+        """
+        # Move imports GameState which imports this module
+        from . import Move
+        positions = Bitboard.positions
+        from_square = code & 63
+        to_square = code >> 6 & 63
+        flags = code >> 12
+        if flags == MoveEncoding.KING_CASTLE:
+            return Move.CastlingMove(gamestate, positions[from_square], "k")
+        if flags == MoveEncoding.QUEEN_CASTLE:
+            return Move.CastlingMove(gamestate, positions[from_square], "q")
+        if flags & MoveEncoding.PROMOTION:
+            # promotions to a Queen have always been made without a piece
+            promote_to = (None if flags & 3 == 3
+                          else MoveEncoding.promotion_class(code))
+            return Move.PromotionMove(gamestate, positions[from_square],
+                                      positions[to_square],
+                                      promote_to=promote_to)
+        if flags == MoveEncoding.EN_PASSANT:
+            return Move.Move(gamestate, positions[from_square],
+                             positions[to_square],
+                             en_passant=positions[(from_square & 56) |
+                                                  (to_square & 7)])
+        return Move.Move(gamestate, positions[from_square],
+                         positions[to_square])
+
+    @staticmethod
+    def to_algebraic_notation(gamestate, code: int) -> str:
+        """
+        The algebraic notation of a code in the current position of a
+        GameState
+        """
+        return MoveEncoding.decode(gamestate, code).to_algebraic_notation()
@@ -0,0 +1,338 @@
+from array import array
+
+from .Bitboard import Bitboard
+from .MoveEncoding import MoveEncoding
+
+
+class MoveGenerator:
+    """
+    Legal move generator. Works out the pieces giving check and the pieces
+    pinned to the king once per position so that only legal moves are
+    generated, rather than playing every psuedolegal move and testing for
+    check afterwards.
+
+    Moves are generated as MoveEncoding codes in an array("H"), legal_moves
+    and captures decode them into Move objects for code that needs them.
+
+    Methods:
+        legal_move_codes(game_state, colour) - returns the legal moves as an
+                                               array of codes
+        legal_moves(game_state, colour) - returns a list of legal moves
+        captures(game_state, colour) - returns the legal captures and
+                                       promotions
+        checks_and_pins(game_state, colour) - returns the checks and pins
+                                              on a colour's king
+
+    The captures and the quiet moves of a position can be generated
+    separately (captures_only, quiets_only), passing the same
+    checks_and_pins result to both so it is only worked out once.
+    """
+    _capture = MoveEncoding.CAPTURE << 12
+    _double_pawn_push = MoveEncoding.DOUBLE_PAWN_PUSH << 12
+    _en_passant = MoveEncoding.EN_PASSANT << 12
+    _queen_promotion = MoveEncoding.QUEEN_PROMOTION << 12
+    _underpromotions = tuple(
+        (MoveEncoding.PROMOTION | MoveEncoding.promotion_flags[piece]) << 12
+        for piece in (Bitboard.ROOK, Bitboard.BISHOP, Bitboard.KNIGHT))
+
+    @staticmethod
+    def legal_moves(game_state, colour: str, get_castling_moves=True,
+                    get_underpromotions=False, from_mask=Bitboard.FULL,
+                    captures_only=False):
+        """
+        Generates the legal moves for a colour as Move objects
+
+        Parameters:
+            GameState game_state - the current board position
+            string colour - value from the set {"w","W","b","B"}
+            bool get_castling_moves - whether to include castling moves
+            bool get_underpromotions - whether to include promotions to a
+                                       Rook, Bishop or Knight as well as a
+                                       Queen
+            int from_mask - bitboard of the squares to generate moves from
+            bool captures_only - only generate captures and promotions
+        """
+        decode = MoveEncoding.decode
+        return [decode(game_state, code) for code in
+                MoveGenerator.legal_move_codes(
+                    game_state, colour, get_castling_moves=get_castling_moves,
+                    get_underpromotions=get_underpromotions,
+                    from_mask=from_mask, captures_only=captures_only)]
+
+    @staticmethod
+    def legal_move_codes(game_state, colour: str, get_castling_moves=True,
+                         get_underpromotions=False, from_mask=Bitboard.FULL,
+                         captures_only=False, quiets_only=False,
+                         analysis=None) -> array:
+        """
+        Generates the legal moves for a colour as MoveEncoding codes, takes
+        the same parameters as legal_moves and
+
+            bool quiets_only - only generate moves that aren't captures or
+                               promotions
+            tuple analysis - the result of checks_and_pins for the position,
+                             worked out if not given
+        """
+        us = Bitboard.colour_index(colour)
+        them = 1 - us
+        bbs = game_state._bitboards
+        own = game_state._occupancy[us]
+        enemy = game_state._occupancy[them]
+        occupied = own | enemy
+        squares = Bitboard.squares
+        capture = MoveGenerator._capture
+        codes = array("H")
+        append = codes.append
+
+        king = bbs[us * 6 + Bitboard.KING]
+        if analysis is None:
+            analysis = MoveGenerator.checks_and_pins(game_state, colour)
+        checkers, check_mask, pins = analysis
+
+        targets = ~own & check_mask
+        if captures_only:
+            targets &= enemy
+        elif quiets_only:
+            targets &= ~enemy
+        from_mask &= own
+
+        # knights, bishops, rooks and queens
+        for piece_type in (Bitboard.KNIGHT, Bitboard.BISHOP,
+                           Bitboard.ROOK, Bitboard.QUEEN):
+            if not targets:
+                break
+            for sq in squares(bbs[us * 6 + piece_type] & from_mask):
+                if piece_type == Bitboard.KNIGHT:
+                    if sq in pins:
+                        continue  # a pinned knight can never move
+                    attacks = Bitboard.knight_table[sq]
+                elif piece_type == Bitboard.BISHOP:
+                    attacks = Bitboard.bishop_attacks_from(sq, occupied)
+                elif piece_type == Bitboard.ROOK:
+                    attacks = Bitboard.rook_attacks_from(sq, occupied)
+                else:
+                    attacks = (Bitboard.rook_attacks_from(sq, occupied) |
+                               Bitboard.bishop_attacks_from(sq, occupied))
+                attacks &= targets & pins.get(sq, Bitboard.FULL)
+                for to_sq in squares(attacks & enemy):
+                    append(sq | to_sq << 6 | capture)
+                for to_sq in squares(attacks & ~enemy):
+                    append(sq | to_sq << 6)
+
+        # pawns
+        pawns = bbs[us * 6 + Bitboard.PAWN] & from_mask
+        if pawns and check_mask:
+            direction = -8 if us == Bitboard.WHITE else 8
+            start_row, end_row = (6, 0) if us == Bitboard.WHITE else (1, 7)
+            en_passant = game_state.en_passant
+            # when only captures are wanted pawns can still push to promote
+            push_targets = ~own & check_mask
+            if captures_only:
+                push_targets &= Bitboard.RANK_1 | Bitboard.RANK_8
+            elif quiets_only:
+                push_targets &= ~(Bitboard.RANK_1 | Bitboard.RANK_8)
+            pawn_table = Bitboard.pawn_table[us]
+            promotions = (MoveGenerator._queen_promotion,)
+            if get_underpromotions:
+                promotions += MoveGenerator._underpromotions
+            for sq in squares(pawns):
+                pin_mask = pins.get(sq, Bitboard.FULL)
+                allowed = targets & pin_mask
+                push_allowed = push_targets & pin_mask
+                # (to square, flags) of each move
+                to_squares = []
+                one = sq + direction
+                if not occupied >> one & 1:
+                    if push_allowed >> one & 1:
+                        to_squares.append((one, 0))
+                    two = one + direction
+                    if (sq >> 3 == start_row and not occupied >> two & 1
+                            and push_allowed >> two & 1):
+                        append(sq | two << 6 | MoveGenerator._double_pawn_push)
+                if quiets_only:
+                    # promotions and captures are left for the other stage
+                    for to_sq, flags in to_squares:
+                        append(sq | to_sq << 6 | flags)
+                    continue
+                for to_sq in squares(pawn_table[sq] & enemy & allowed):
+                    to_squares.append((to_sq, capture))
+
+                for to_sq, flags in to_squares:
+                    if to_sq >> 3 != end_row:
+                        append(sq | to_sq << 6 | flags)
+                        continue
+                    for promotion in promotions:
+                        append(sq | to_sq << 6 | flags | promotion)
+
+                if (en_passant and en_passant[1] == (sq >> 3) - (
+                        1 if us == Bitboard.WHITE else -1)
+                        and abs(en_passant[0] - (sq & 7)) == 1):
+                    code = MoveGenerator._en_passant_move(
+                        game_state, us, sq, en_passant, check_mask, pin_mask)
+                    if code is not None:
+                        append(code)
+
+        # king
+        if king & from_mask:
+            king_sq = Bitboard.lsb_index(king)
+            # the king is removed so that it can't hide behind itself when
+            # moving away from a sliding piece
+            without_king = occupied ^ king
+            attacks = Bitboard.king_table[king_sq] & ~own
+            if not quiets_only:
+                for to_sq in squares(attacks & enemy):
+                    if not game_state._is_attacked(to_sq, them, without_king):
+                        append(king_sq | to_sq << 6 | capture)
+            if not captures_only:
+                for to_sq in squares(attacks & ~enemy):
+                    if not game_state._is_attacked(to_sq, them, without_king):
+                        append(king_sq | to_sq << 6)
+
+            if get_castling_moves and not checkers and not captures_only:
+                codes.extend(MoveGenerator._castling_moves(
+                    game_state, us, king_sq, occupied))
+
+        return codes
+
+    @staticmethod
+    def checks_and_pins(game_state, colour: str) -> tuple:
+        """
+        Returns a tuple of (checkers, check_mask, pins) for a colour's king
+
+            int checkers - bitboard of the pieces giving check
+            int check_mask - bitboard of the squares pieces other than the
+                             king must move to, all squares unless the king
+                             is in check and none in double check
+            dict pins - square of each pinned piece to the bitboard of the
+                        squares it may move along
+        """
+        us = Bitboard.colour_index(colour)
+        them = 1 - us
+        bbs = game_state._bitboards
+        own = game_state._occupancy[us]
+        occupied = own | game_state._occupancy[them]
+        king = bbs[us * 6 + Bitboard.KING]
+        their_rooks = bbs[them * 6 + Bitboard.ROOK] | bbs[them * 6 + Bitboard.QUEEN]
+        their_bishops = bbs[them * 6 + Bitboard.BISHOP] | bbs[them * 6 + Bitboard.QUEEN]
+
+        # squares pieces other than the king must move to, all squares unless
+        # the king is in check
+        check_mask = Bitboard.FULL
+        # pinned piece square -> the squares it may move along
+        pins = {}
+        checkers = 0
+        if king:
+            king_sq = Bitboard.lsb_index(king)
+            checkers = ((Bitboard.pawn_table[us][king_sq] &
+                         bbs[them * 6 + Bitboard.PAWN]) |
+                        (Bitboard.knight_table[king_sq] &
+                         bbs[them * 6 + Bitboard.KNIGHT]))
+            if checkers:
+                check_mask = checkers
+            ray_attacks = Bitboard.ray_attacks_from
+            for directions, sliders in (
+                    (Bitboard.ROOK_DIRECTIONS, their_rooks),
+                    (Bitboard.BISHOP_DIRECTIONS, their_bishops)):
+                if not sliders:
+                    continue
+                for direction in directions:
+                    # nothing can check or pin along an empty line
+                    if not Bitboard.ray_table[direction][king_sq] & sliders:
+                        continue
+                    ray = ray_attacks(king_sq, occupied, direction)
+                    blocker = ray & occupied
+                    if blocker & sliders:
+                        checkers |= blocker
+                        check_mask = (ray if check_mask == Bitboard.FULL
+                                      else 0)
+                    elif blocker & own:
+                        blocker_sq = Bitboard.lsb_index(blocker)
+                        beyond = ray_attacks(blocker_sq, occupied, direction)
+                        if beyond & occupied & sliders:
+                            pins[blocker_sq] = ray | beyond
+            if checkers & (checkers - 1):
+                # double check, only the king can move
+                check_mask = 0
+
+        return checkers, check_mask, pins
+
+    @staticmethod
+    def captures(game_state, colour: str, get_underpromotions=False):
+        """
+        Generates only the legal captures (including en passant) and
+        promotions for a colour, for searching the quiet positions at the end
+        of the main search
+
+        Parameters:
+            GameState game_state - the current board position
+            string colour - value from the set {"w","W","b","B"}
+            bool get_underpromotions - whether to include underpromotions
+        """
+        return MoveGenerator.legal_moves(
+            game_state, colour, get_castling_moves=False,
+            get_underpromotions=get_underpromotions, captures_only=True)
+
+    @staticmethod
+    def _en_passant_move(game_state, us, sq, en_passant, check_mask, pin_mask):
+        """
+        Returns the code of the en passant capture for the pawn on 'sq' or
+        None if it would leave the king in check. Taking en passant removes
+        two pieces from the same rank so it is tested by looking for sliding
+        pieces that would attack the king afterwards.
+        """
+        them = 1 - us
+        bbs = game_state._bitboards
+        to_sq = Bitboard.square_index(en_passant)
+        captured_sq = (sq & ~7) | (to_sq & 7)
+        if not (bbs[them * 6 + Bitboard.PAWN] >> captured_sq & 1):
+            return None
+        # must either block the check or capture the pawn giving check
+        if not (check_mask >> to_sq & 1 or check_mask >> captured_sq & 1):
+            return None
+        if not pin_mask >> to_sq & 1:
+            return None
+
+        king_sq = Bitboard.lsb_index(bbs[us * 6 + Bitboard.KING])
+        occupied = ((game_state._occupancy[0] | game_state._occupancy[1]) ^
+                    (1 << sq) ^ (1 << captured_sq) | (1 << to_sq))
+        queens = bbs[them * 6 + Bitboard.QUEEN]
+        if Bitboard.rook_attacks_from(king_sq, occupied) & (
+                bbs[them * 6 + Bitboard.ROOK] | queens):
+            return None
+        if Bitboard.bishop_attacks_from(king_sq, occupied) & (
+                bbs[them * 6 + Bitboard.BISHOP] | queens):
+            return None
+
+        return sq | to_sq << 6 | MoveGenerator._en_passant
+
+    @staticmethod
+    def _castling_moves(game_state, us, king_sq, occupied):
+        """
+        Codes of the castling moves for a king that is not in check. The
+        colour must still have the castling right, the squares between the
+        king and rook must be empty and the king can't pass through or land on
+        an attacked square.
+        """
+        codes = []
+        y = 7 if us == Bitboard.WHITE else 0
+        if king_sq != 4 + y * 8:
+            return codes
+        them = 1 - us
+        rooks = game_state._bitboards[us * 6 + Bitboard.ROOK]
+
+        # (right, rook x, squares that must be empty, squares the king
+        # crosses, flag)
+        sides = ((1, 7, (5, 6), (5, 6), MoveEncoding.KING_CASTLE),
+                 (2, 0, (1, 2, 3), (3, 2), MoveEncoding.QUEEN_CASTLE))
+        for right, rook_x, between, crossed, flag in sides:
+            if not game_state._castling_rights & right << (2 * us):
+                continue
+            if not rooks >> (rook_x + y * 8) & 1:
+                continue
+            if any(occupied >> (x + y * 8) & 1 for x in between):
+                continue
+            if any(game_state._is_attacked(x + y * 8, them, occupied)
+                   for x in crossed):
+                continue
+            codes.append(king_sq | (crossed[1] + y * 8) << 6 | flag << 12)
+        return codes
@@ -0,0 +1,183 @@
+import argparse
+import concurrent.futures
+import time
+
+from .GameState import GameState
+from .MoveEncoding import MoveEncoding
+
+
+class Perft:
+    """
+    Counts the positions reached by playing every legal move to a fixed depth
+    (https://www.chessprogramming.org/Perft). Comparing the counts with known
+    results checks the move generator and the time taken measures its speed.
+
+    Usage:
+        python -m chess_game.Perft --fen <fen> --depth <n> [--divide]
+        python -m chess_game.Perft --suite [--depth <n>] [--workers <n>]
+
+    Properties:
+        positions - tuple of (name, fen, counts) where counts[i] is the number
+                    of positions at depth i + 1
+    """
+    positions = (
+        ("start", "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+         (20, 400, 8902, 197281, 4865609)),
+        ("kiwipete",
+         "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+         (48, 2039, 97862, 4085603)),
+        ("position 3", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+         (14, 191, 2812, 43238, 674624)),
+        ("position 4",
+         "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+         (6, 264, 9467, 422333)),
+        ("position 5",
+         "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+         (44, 1486, 62379, 2103487)),
+        ("position 6",
+         "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+         (46, 2079, 89890, 3894594)),
+    )
+
+    @staticmethod
+    def perft(gamestate, depth: int) -> int:
+        """
+        Returns the number of positions reached after depth half moves
+
+        Parameters:
+            GameState gamestate - the position to count from, it is the same
+                                  position again when the count is finished
+            int depth - number of half moves to play
+        """
+        if depth == 0:
+            return 1
+        codes = gamestate.get_legal_move_codes(gamestate.player_to_play,
+                                               get_underpromotions=True)
+        if depth == 1:
+            return len(codes)
+        nodes = 0
+        for code in codes:
+            gamestate.make_move_code(code)
+            nodes += Perft.perft(gamestate, depth - 1)
+            gamestate.undo_move()
+        return nodes
+
+    @staticmethod
+    def divide(gamestate, depth: int, workers=1) -> dict:
+        """
+        Returns a dict of each legal move in algebraic notation to the number
+        of positions reached after it, useful for finding which move a wrong
+        count comes from
+
+        Parameters:
+            GameState gamestate - the position to count from
+            int depth - number of half moves to play, including the first
+            int workers - number of processes to share the root moves between
+        """
+        codes = gamestate.get_legal_move_codes(gamestate.player_to_play,
+                                               get_underpromotions=True)
+        notations = [MoveEncoding.to_algebraic_notation(gamestate, code)
+                     for code in codes]
+        if workers > 1 and depth > 1:
+            fen = gamestate.generate_fen()
+            with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+                counts = list(executor.map(
+                    Perft._divide_move, [fen] * len(codes), codes,
+                    [depth] * len(codes)))
+            return dict(zip(notations, counts))
+
+        counts = {}
+        for notation, code in zip(notations, codes):
+            gamestate.make_move_code(code)
+            counts[notation] = Perft.perft(gamestate, depth - 1)
+            gamestate.undo_move()
+        return counts
+
+    @staticmethod
+    def _divide_move(fen, code, depth):
+        """
+        Counts the positions after one root move, run in a worker process
+        """
+        gamestate = GameState(fen_string=fen)
+        gamestate.make_move_code(code)
+        return Perft.perft(gamestate, depth - 1)
+
+    @staticmethod
+    def run(fen_string, depth, divide=False, workers=1):
+        """
+        Counts from a FEN string and prints the result, returns a tuple of
+        (nodes, seconds taken)
+        """
+        gamestate = GameState(fen_string=fen_string)
+        start = time.perf_counter()
+        if divide or workers > 1:
+            counts = Perft.divide(gamestate, depth, workers=workers)
+            nodes = sum(counts.values())
+        else:
+            nodes = Perft.perft(gamestate, depth)
+        seconds = time.perf_counter() - start
+        if divide:
+            for notation, count in counts.items():
+                print(f"{notation}: {count}")
+        print(f"depth {depth}: {nodes} nodes in {seconds:.2f}s "
+              f"({Perft.nodes_per_second(nodes, seconds):.0f} nodes/s)")
+        return nodes, seconds
+
+    @staticmethod
+    def run_suite(max_depth=3, workers=1) -> bool:
+        """
+        Counts each of the standard positions up to max_depth and prints
+        whether the counts are right, returns True if they all are
+        """
+        passed = True
+        total_nodes = 0
+        total_seconds = 0
+        for name, fen_string, counts in Perft.positions:
+            gamestate = GameState(fen_string=fen_string)
+            for depth, expected in enumerate(counts[:max_depth], 1):
+                start = time.perf_counter()
+                if workers > 1:
+                    nodes = sum(Perft.divide(
+                        gamestate, depth, workers=workers).values())
+                else:
+                    nodes = Perft.perft(gamestate, depth)
+                seconds = time.perf_counter() - start
+                total_nodes += nodes
+                total_seconds += seconds
+                result = "ok" if nodes == expected else f"FAIL ({expected})"
+                passed = passed and nodes == expected
+                print(f"{name} depth {depth}: {nodes} {result} "
+                      f"{seconds:.2f}s")
+        print(f"{total_nodes} nodes in {total_seconds:.2f}s "
+              f"({Perft.nodes_per_second(total_nodes, total_seconds):.0f} "
+              "nodes/s)")
+        return passed
+
+    @staticmethod
+    def nodes_per_second(nodes, seconds) -> float:
+        return nodes / seconds if seconds else 0.0
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m chess_game.Perft",
+        description="Count the positions reached from a FEN to a depth")
+    parser.add_argument("--fen", default=Perft.positions[0][1],
+                        help="position to count from (default: start)")
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--divide", action="store_true",
+                        help="print the count after each root move")
+    parser.add_argument("--suite", action="store_true",
+                        help="check the standard positions up to --depth")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="processes to share the root moves between")
+    args = parser.parse_args(args)
+
+    if args.suite:
+        return 0 if Perft.run_suite(args.depth, workers=args.workers) else 1
+    Perft.run(args.fen, args.depth, divide=args.divide, workers=args.workers)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
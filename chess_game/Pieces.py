@@ -1,4 +1,5 @@
-from . import Move
+from . import Move, MoveGenerator
+from .Bitboard import Bitboard
 
 
 class Piece:
@@ -15,6 +16,7 @@ class Piece:
     _position = (None, None)
     _move_count = 0
     _letter = "F"
+    _type_index = -1  # index of the piece type used by Bitboard
 
     def __init__(self, number, position, color, move_count=0):
         self.number = number
@@ -29,6 +31,13 @@ class Piece:
     def move_count(self) -> int:
         return self._move_count
 
+    @property
+    def bitboard_index(self) -> int:
+        """
+        The index of the bitboard that stores pieces of this type and colour
+        """
+        return self._type_index + (6 if self.colour.lower() == "b" else 0)
+
     @property
     def letter(self) -> str:
         if self.colour.lower() == "w":
@@ -81,9 +90,10 @@ class Piece:
             self._moved = False
 
     def get_legal_moves(self, game_state, get_castling_moves=True):
-        moves = self._get_legal_moves(game_state)
-        moves = self._remove_moves_that_dont_break_check(game_state, moves)
-        return moves
+        from_mask = 1 << (self.position[0] + (self.position[1] * 8))
+        return MoveGenerator.MoveGenerator.legal_moves(
+            game_state, self.colour, get_castling_moves=get_castling_moves,
+            from_mask=from_mask)
 
     def get_pseudolegal_moves(self, game_state, get_castling_moves=True):
         return self._get_legal_moves(game_state, get_castling_moves=get_castling_moves)
@@ -101,49 +111,28 @@ class Piece:
                             can go (allows for the King to move only 1)
         """
         diag_moves = []
+        squares = game_state._squares
+        positions = Bitboard.positions
+        square = Bitboard.square_index(self.position)
+        colour = self.colour.lower()
 
         for direction in directions:
-            for i in range(1, max_range):
-                pos = (self.position[0]+(i*direction[0]),
-                       self.position[1]+(i*direction[1]))
-                if game_state.square_exists(pos):
-                    if not game_state.square_is_empty(pos):
-                        piece = game_state.get_square(pos).get_piece()
-                        if piece.colour == self.colour.lower():
-                            break
-                        else:
-                            diag_moves.append(
-                                Move.Move(game_state, self.position, pos))
-                            break
-                    else:
-                        diag_moves.append(
-                            Move.Move(game_state, self.position, pos))
+            # the squares in the direction come from a table so there are no
+            # bounds to check
+            ray = Bitboard.ray_squares[
+                Bitboard.DIRECTIONS.index(direction)][square]
+            for index in ray[:max_range - 1]:
+                piece = squares[index]._piece
+                if piece:
+                    if piece.colour.lower() != colour:
+                        diag_moves.append(Move.Move(
+                            game_state, self.position, positions[index]))
+                    break
+                diag_moves.append(
+                    Move.Move(game_state, self.position, positions[index]))
 
         return diag_moves
 
-    # awful name but I got nothing better
-    def _remove_moves_that_dont_break_check(self, game_state, moves):
-        """
-        Removes, from a list of moves, moves that do not take the player out of
-        check. This is to be used when a player is in check and as a result is
-        obliged to play a move out of check if one exists
-        """
-
-        legal_moves = []
-        for move in moves:
-            if move.castling: # cant make a castling move when in check
-                continue
-            mv_copy = move.clone()
-            gs_copy = game_state.clone()
-            mv_copy._gamestate = gs_copy
-            gs_copy.make_move(mv_copy, check_legality=False)
-
-            if not gs_copy.check(self.colour):
-                legal_moves.append(move)
-            # gs_copy.undo_move()
-
-        return legal_moves
-
     @colour.setter
     def colour(self, value):
         self._colour = value
@@ -154,6 +143,7 @@ class Pawn(Piece):
     Implementation of Piece class
     """
     _letter = "P"
+    _type_index = 0
 
     # Don't like that you have to pass the game state numerous times
     def __init__(self, number, position, color, move_count=0):
@@ -168,8 +158,6 @@ class Pawn(Piece):
             "W": {"start_row": 6, "end_row": 0, "direction": -1}}
 
         info = colour_info[self.colour.upper()]
-        other_colour_info = colour_info["B" if self.colour.upper(
-        ) == "W" else "W"]
         if self.position[1] == info["start_row"]:
             move_to = (self.position[0], self.position[1] +
                        (2*info["direction"]))
@@ -208,27 +196,14 @@ class Pawn(Piece):
             print("We should never get here")
 
         # en-passant
-        if self.position[1] == other_colour_info["start_row"]+(2*other_colour_info["direction"]):
-            # print(self.colour, self.position, other_colour_info)
-            directions = [+1, -1]
-            for direction in directions:  # for left and right
-                potential_pos = (self.position[0]+direction, self.position[1])
-
-                # if there is a piece in the pos horizontal and the square horizontal exists
-                if not game_state.square_is_empty(potential_pos) and game_state.square_exists(potential_pos):
-                    # get the piece in this square
-                    piece = game_state.get_square(potential_pos).get_piece()
-                    # if the piece is of the opposing colour and its a pawn and it has only moved once
-                    if (piece.colour.lower() != self.colour.lower() and
-                        piece.letter.lower() == "p" and piece.move_count == 1
-                        and getattr(game_state.moves.peek(), "position_to")
-                            == potential_pos):
-                        legal_moves.append(
-                            Move.Move(game_state,
-                                      self.position,
-                                      (self.position[0]+direction,
-                                       self.position[1]+info["direction"]),
-                                      en_passant=potential_pos))
+        en_passant = game_state.en_passant
+        if (en_passant and abs(en_passant[0] - self.position[0]) == 1 and
+                en_passant[1] == self.position[1] + info["direction"] and
+                not game_state.square_is_empty(
+                    (en_passant[0], self.position[1]))):
+            legal_moves.append(
+                Move.Move(game_state, self.position, en_passant,
+                          en_passant=(en_passant[0], self.position[1])))
 
         return legal_moves
 
@@ -239,6 +214,7 @@ class Bishop(Piece):
     """
 
     _letter = "B"
+    _type_index = 2
 
     # Don't like that you have to pass the game state numerous times
     def __init__(self, number, position, color, move_count=0):
@@ -256,6 +232,7 @@ class Queen(Piece):
     """
 
     _letter = "Q"
+    _type_index = 4
 
     # Don't like that you have to pass the game state numerous times
     def __init__(self, number, position, color, move_count=0):
@@ -274,6 +251,7 @@ class King(Piece):
     """
 
     _letter = "K"
+    _type_index = 5
 
     # Don't like that you have to pass the game state numerous times
     def __init__(self, number, position, color, move_count=0):
@@ -285,8 +263,7 @@ class King(Piece):
         legal_moves = self._get_possible_moves(
             game_state, directions, max_range=2)
 
-        if (self.move_count == 0 and 
-         (self.position==(4,0) or self.position==(4,7)) 
+        if ((self.position==(4,0) or self.position==(4,7))
          and get_castling_moves):
             king_row = {"w": 7, "b": 0}
             y = king_row[self.colour.lower()]
@@ -302,7 +279,8 @@ class King(Piece):
                 side = castling_positions[move.position_to]
                 rook_pos = positions[side]["rook_pos"]
                 rook = game_state.get_square(rook_pos).get_piece()
-                if not rook or rook.letter.lower() != "r" or rook.move_count != 0:
+                if (not rook or rook.letter.lower() != "r" or
+                        not game_state.has_castling_right(self.colour, side)):
                     can_castle = False
                     continue
                 colour = rook.colour
@@ -310,12 +288,14 @@ class King(Piece):
                 opposition_colour = ["B", "W"][[
                     "W", "B"].index(colour.upper())]
                 for x in range(rook_pos[0]+direction, self.position[0], direction):
-                    square = game_state.get_square((x, y))
-                    if square.is_under_attack(colours=opposition_colour):
+                    if game_state.get_square((x, y)).get_piece():
                         can_castle = False
-                    piece = square.get_piece()
-                    if piece:
+                        break
+                # the king can't pass through an attacked square
+                for x in range(self.position[0]-direction, move.position_to[0]-direction, -direction):
+                    if game_state.is_square_attacked((x, y), opposition_colour):
                         can_castle = False
+                        break
 
                 if can_castle:
                     legal_moves.append(Move.CastlingMove(
@@ -333,6 +313,7 @@ class Rook(Piece):
     """
 
     _letter = "R"
+    _type_index = 3
 
     # Don't like that you have to pass the game state numerous times
     def __init__(self, number, position, color, move_count=0):
@@ -351,6 +332,7 @@ class Knight(Piece):
     """
 
     _letter = "N"
+    _type_index = 1
 
     # Don't like that you have to pass the game state numerous times
     def __init__(self, number, position, color, move_count=0):
@@ -358,20 +340,14 @@ class Knight(Piece):
 
     def _get_legal_moves(self, game_state, get_castling_moves=True):
         legal_moves = []
-
-        # Chose not to generate these programatically as would only slow down
-        # the program and serve no real purpose other than showing off
-        possible_changes = [(-2, -1), (-2, +1), (+2, -1),
-                            (+2, +1), (-1, -2), (-1, +2), (+1, -2), (+1, +2)]
-
-        for change in possible_changes:
-            possible_move_to = (
-                self.position[0]+change[0], self.position[1]+change[1])
-            exists = game_state.square_exists(possible_move_to)
-            if exists:
-                is_empty = game_state.square_is_empty(possible_move_to)
-                if (is_empty or game_state.get_square(possible_move_to).get_piece().colour.lower() != self.colour.lower()):
-                    legal_moves.append(
-                        Move.Move(game_state, self.position, possible_move_to))
+        squares = game_state._squares
+        colour = self.colour.lower()
+
+        for index in Bitboard.knight_targets[
+                Bitboard.square_index(self.position)]:
+            piece = squares[index]._piece
+            if not piece or piece.colour.lower() != colour:
+                legal_moves.append(Move.Move(
+                    game_state, self.position, Bitboard.positions[index]))
 
         return legal_moves
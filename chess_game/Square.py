@@ -17,6 +17,7 @@ class Square:
 
     def __init__(self, gamestate, position):
         self._position = position
+        self._index = position[0] + (position[1] * 8)
         self._gamestate = gamestate
 
     def clone(self, gamestate_clone):
@@ -27,17 +28,14 @@ class Square:
         return clone
 
     def is_under_attack(self, colours="bw"):
-        moves = []
+        """
+        Returns whether the square is attacked by a piece of any of the
+        colours given
+        """
         for col in list(colours):
-            moves += [m for m in self._gamestate.get_pseudolegal_moves(
-                col, get_castling_moves=False)]
-
-        for move in moves:
-            if move.normal:
-                if move.position_to == self.position:
-                    return True
-        else:
-            return False
+            if self._gamestate.is_square_attacked(self.position, col):
+                return True
+        return False
 
     @property
     def position(self):
@@ -66,6 +64,7 @@ class Square:
             raise Exception("Can't pop_piece if there isn't one")
         p.position = (None, None)
         self._piece = None
+        self._gamestate._remove_from_bitboards(p, self._index)
         return p
 
     def get_piece(self):
@@ -82,6 +81,7 @@ class Square:
         if not self._piece:
             self._piece = piece
             self._piece.position = self.position
+            self._gamestate._add_to_bitboards(piece, self._index)
         else:
             raise Exception(f"Pop or Remove piece before setting a new one.")
             # TODO: make a relevant exception so it can be caught without catching all errors
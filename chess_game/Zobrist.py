@@ -0,0 +1,64 @@
+import random
+
+from .Bitboard import Bitboard
+
+# seeded so that every process generates the same keys, which lets hashes be
+# compared between processes
+_random = random.Random(0x5EED)
+
+
+class Zobrist:
+    """
+    Random keys for Zobrist hashing (https://www.chessprogramming.org/Zobrist_Hashing).
+    A position's key is the XOR of the key for every piece on its square, the
+    side to move (when black), the castling rights and the file of the en
+    passant square, so it can be updated a piece at a time as moves are made.
+
+    Properties:
+        piece_keys - indexed by (bitboard index * 64) + square index
+        black_to_move_key
+        castling_keys - indexed by the castling rights bitmask (0-15)
+        en_passant_keys - indexed by file
+    """
+    piece_keys = tuple(_random.getrandbits(64) for i in range(12 * 64))
+    black_to_move_key = _random.getrandbits(64)
+    en_passant_keys = tuple(_random.getrandbits(64) for i in range(8))
+    castling_keys = ()  # filled in below the class
+
+    @staticmethod
+    def hash(gamestate) -> int:
+        """
+        Calculates the key of a position from scratch
+        """
+        key = 0
+        for index, bb in enumerate(gamestate._bitboards):
+            for square in Bitboard.squares(bb):
+                key ^= Zobrist.piece_keys[index * 64 + square]
+        if gamestate.player_to_play.lower() == "b":
+            key ^= Zobrist.black_to_move_key
+        key ^= Zobrist.castling_keys[gamestate.castling_rights]
+        if gamestate.en_passant:
+            key ^= Zobrist.en_passant_keys[gamestate.en_passant[0]]
+        return key
+
+    @staticmethod
+    def pawn_hash(gamestate) -> int:
+        """
+        Calculates the key of a position's pawns from scratch, the XOR of the
+        piece key of every pawn
+        """
+        key = 0
+        for index in (Bitboard.PAWN, Bitboard.PAWN + 6):
+            for square in Bitboard.squares(gamestate._bitboards[index]):
+                key ^= Zobrist.piece_keys[index * 64 + square]
+        return key
+
+
+# one key for each of K, Q, k and q combined for every set of rights
+_castling_right_keys = [_random.getrandbits(64) for i in range(4)]
+Zobrist.castling_keys = tuple(
+    _castling_right_keys[0] * (rights & 1) ^
+    _castling_right_keys[1] * (rights >> 1 & 1) ^
+    _castling_right_keys[2] * (rights >> 2 & 1) ^
+    _castling_right_keys[3] * (rights >> 3 & 1)
+    for rights in range(16))
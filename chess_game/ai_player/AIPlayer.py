@@ -1,70 +1,511 @@
+import threading
+import time
+
 from .. import Player
+from ..MoveEncoding import MoveEncoding
 from .Evaluation import Evaluation
+from .MoveOrdering import MoveOrderer
+from .PawnTable import PawnTable
+from .ParallelSearch import LazySMPSearch, ParallelSearch
+from .SharedTranspositionTable import SharedTranspositionTable
+from .TranspositionTable import TranspositionTable
+
+
+class SearchAborted(Exception):
+    """
+    Raised inside the search when it runs out of time or nodes or is stopped
+    """
+    pass
 
 
 class AIPlayer(Player.BasePlayer):
-    def __init__(self, colour):
+    """
+    Computer player using iterative deepening alpha-beta search with a
+    transposition table. The search deepens one half move at a time until it
+    reaches the maximum depth or runs out of its time or node budget, and
+    plays the best move from the last depth it finished. At the end of the
+    search captures are played out with a quiescence search.
+
+    With more than one worker the search is run in several processes, in one
+    of two modes:
+        "root" - the root moves are shared between worker processes, after
+                 the first move has been searched to find a score for the
+                 others to beat
+        "lazy_smp" - helper processes search the same position as the main
+                     search at staggered depths, sharing one transposition
+                     table in shared memory that is kept between moves
+
+    Properties:
+        depth - the maximum number of half moves to search
+        time_limit - seconds allowed per move, or None for no limit
+        node_limit - positions allowed per move, or None for no limit
+        transposition_table - results of previous searches, kept between
+                              moves
+        move_orderer - killer moves and history scores used to order moves
+        pawn_table - pawn structure scores, kept between moves
+        completed_depth - the depth of the last search that finished
+        nodes - the number of positions visited by the last search
+        workers - the number of processes to search with
+        parallel_mode - "root" or "lazy_smp"
+    """
+    INFINITY = 10000000
+    # score for being checkmated, higher than any evaluation
+    MATE = 1000000
+    # how many nodes are searched between checks of the clock
+    check_interval = 256
+    # how many nodes a worker of a parallel search searches between adding
+    # them to the count shared with the other workers, when there is a node
+    # limit
+    shared_check_interval = 16
+    # a capture is skipped in quiescence search if winning the piece plus
+    # this margin still can't raise the score to alpha
+    delta_margin = 200
+
+    def __init__(self, colour, depth=2, tt_size_mb=16, time_limit=None,
+                 node_limit=None, workers=1, parallel_mode="root"):
         super().__init__(colour)
+        self.depth = depth
+        self.workers = workers
+        self.parallel_mode = parallel_mode
+        self.time_limit = time_limit
+        self.node_limit = node_limit
+        if workers > 1 and parallel_mode == "lazy_smp":
+            self.transposition_table = SharedTranspositionTable(
+                size_mb=tt_size_mb)
+        else:
+            self.transposition_table = TranspositionTable(size_mb=tt_size_mb)
+        self.move_orderer = MoveOrderer()
+        self.pawn_table = PawnTable()
+        self.completed_depth = 0
+        self.nodes = 0
+        self.score = 0
+        self._stop_event = threading.Event()
+        self._deadline = None
+        self._next_check = 0
+        # the node count shared by the workers of a parallel search, and how
+        # many of this searcher's nodes have been added to it
+        self._shared_nodes = None
+        self._counted_nodes = 0
+        self._parallel_search = None
+        if workers > 1:
+            if parallel_mode == "root":
+                self._parallel_search = ParallelSearch(
+                    AIPlayer, workers, tt_size_mb=tt_size_mb)
+            elif parallel_mode == "lazy_smp":
+                self._parallel_search = LazySMPSearch(
+                    AIPlayer, workers, self.transposition_table)
+            else:
+                raise Exception(f"Unknown parallel mode {parallel_mode}")
+
+    def stop(self):
+        """
+        Stops a search that is in progress, it will return the best move from
+        the last depth it finished. Safe to call from another thread.
+        """
+        self._stop_event.set()
+        if self._parallel_search:
+            self._parallel_search.stop()
+
+    def close(self):
+        """
+        Shuts down the worker processes of a parallel search and frees the
+        shared transposition table
+        """
+        if self._parallel_search:
+            self._parallel_search.close()
+        if isinstance(self.transposition_table, SharedTranspositionTable):
+            self.transposition_table.close()
 
     def get_next_move(self):
-        best_value = (+10000000 if self.colour.lower() == "w" else -10000000)
-        best_move = None
-        for move in self.gamestate.get_legal_moves(self.colour):
-            gs_cpy = self.gamestate.clone()
-            move_cpy = move.clone()
-            move_cpy.gamestate = gs_cpy
-            gs_cpy.make_move(move_cpy)
-
-            value = self.alphabeta(gs_cpy, 1, -10000000,
-                                   +10000000, (True if self.colour.lower() == "w" else False))
-            if self.colour.lower() == "w":
-                if best_value > value:
-                    best_value = value
-                    best_move = move
-            elif self.colour.lower() == "b":
-                if best_value < value:
-                    best_value = value
-                    best_move = move
+        # the search makes and undoes moves on one copy of the board so the
+        # game being played is never left part way through a search
+        gamestate = self.gamestate.clone()
+        best_code = self.search(gamestate)
+        if best_code is None:
+            best_code = self.gamestate.get_legal_move_codes(self.colour)[0]
+
+        # the search only uses encoded moves, the game is given a Move
+        best_move = MoveEncoding.decode(self.gamestate, best_code)
         best_move.print()
         return best_move
 
-    @ staticmethod
-    def alphabeta(gamestate, depth, alpha, beta, maximising):
+    def search(self, gamestate):
+        """
+        Iterative deepening search of a position, returns the MoveEncoding
+        code of the best move found or None if no depth was finished
+
+        Parameters:
+            GameState gamestate - the position to search, it is left in an
+                                  unknown state if the search is aborted
+        """
+        self._stop_event.clear()
+        deadline = (time.time() + self.time_limit
+                    if self.time_limit is not None else None)
+        if self.parallel_mode != "lazy_smp" or not self._parallel_search:
+            self._start_search(deadline, self.node_limit)
+            return self._deepen(gamestate, 1, self.depth)
+
+        # the main search counts its nodes with the helpers' so the node
+        # limit is for all of them together
+        self._shared_nodes = self._parallel_search.shared_nodes
+        self._start_search(deadline, self.node_limit)
+        self._parallel_search.start(gamestate, self.depth, deadline,
+                                    self.node_limit)
+        try:
+            return self._deepen(gamestate, 1, self.depth)
+        finally:
+            self._count_shared_nodes()
+            self._shared_nodes = None
+            self.nodes += self._parallel_search.finish()
+
+    def search_helper(self, gamestate, first_depth, max_depth, deadline=None,
+                      node_limit=None) -> int:
+        """
+        Searches a position until it is stopped or reaches max_depth, only
+        for the results it stores in the transposition table. Used by the
+        helper processes of a Lazy SMP search, returns the nodes searched.
+
+        Parameters:
+            GameState gamestate - the position to search
+            int first_depth - the depth to start deepening from
+            int max_depth - the deepest depth to search
+            float deadline - time.time() the search must stop by, or None
+            int node_limit - positions allowed, shared with the main search
+                             and the other helpers if they share a node
+                             count, or None
+        """
+        self._start_search(deadline, node_limit)
+        self._deepen(gamestate, first_depth, max_depth)
+        if self._shared_nodes is not None:
+            self._count_shared_nodes()
+        return self.nodes
+
+    def _start_search(self, deadline, node_limit):
+        self.nodes = 0
+        self._counted_nodes = 0
+        self.node_limit = node_limit
+        self._next_check = (self.shared_check_interval
+                            if self._shared_nodes is not None
+                            else self.check_interval)
+        self._deadline = deadline
+        self.completed_depth = 0
+        self.move_orderer.new_search()
+
+    def _deepen(self, gamestate, first_depth, max_depth):
+        """
+        Searches each depth from first_depth to max_depth, returns the code
+        of the best move from the deepest depth finished
+        """
+        best_key = None
+        for depth in range(first_depth, max_depth + 1):
+            try:
+                if self._parallel_search and self.parallel_mode == "root":
+                    score = self._parallel_root(gamestate, depth)
+                else:
+                    score = self.alphabeta(gamestate, depth,
+                                           -AIPlayer.INFINITY,
+                                           AIPlayer.INFINITY)
+            except SearchAborted:
+                break
+            entry = self.transposition_table.probe(gamestate.zobrist_key)
+            if entry:
+                best_key = entry[3]
+            self.score = score
+            self.completed_depth = depth
+            # no point searching deeper once a forced mate has been found
+            if abs(score) > AIPlayer.MATE - 1000:
+                break
+        return best_key
+
+    def _parallel_root(self, gamestate, depth):
+        """
+        Searches the root position to a depth with the moves shared between
+        worker processes, returns the score. The first move is searched here
+        first (young brothers wait) so the workers start with a good alpha.
+        """
+        moves = gamestate.get_legal_move_codes(gamestate.player_to_play)
+        if not moves:
+            return self.alphabeta(gamestate, depth, -AIPlayer.INFINITY,
+                                  AIPlayer.INFINITY)
+        key = gamestate.zobrist_key
+        entry = self.transposition_table.probe(key)
+        moves = self.move_orderer.order_moves(
+            gamestate, moves, 0, entry[3] if entry else None)
+
+        best_move = moves[0]
+        gamestate.make_move_code(best_move)
+        best_score = -self.alphabeta(gamestate, depth - 1, -AIPlayer.INFINITY,
+                                     AIPlayer.INFINITY, 1)
+        gamestate.undo_move()
+
+        node_limit = (self.node_limit - self.nodes
+                      if self.node_limit is not None else None)
+        results = self._parallel_search.search_root(
+            gamestate, moves[1:], depth, best_score, AIPlayer.INFINITY,
+            self._deadline, node_limit)
+        aborted = False
+        for move, score, nodes in results:
+            self.nodes += nodes
+            if score is None:
+                aborted = True
+            elif score > best_score:
+                best_score = score
+                best_move = move
+        if aborted or self._stop_event.is_set():
+            raise SearchAborted()
+
+        self.transposition_table.store(
+            key, depth, TranspositionTable.EXACT,
+            self._score_to_table(best_score, 0), best_move)
+        return best_score
+
+    def search_root_move(self, gamestate, move, depth, alpha, beta,
+                         deadline=None, node_limit=None):
+        """
+        Searches one move from the root position, returns its score from the
+        point of view of the side playing it or None if the search ran out of
+        time or nodes. Used by the worker processes of a parallel search.
+
+        Parameters:
+            GameState gamestate - the root position, left in an unknown state
+                                  if the search runs out of time or nodes
+            int move - code of the move to search
+            int depth - depth of the search from the root
+            int alpha - the minimum score
+            int beta - the maximum score
+            float deadline - time.time() the search must stop by, or None
+            int node_limit - positions allowed, shared with the other
+                             workers if they share a node count, or None
+        """
+        self.nodes = 0
+        self._counted_nodes = 0
+        self.node_limit = node_limit
+        self._deadline = deadline
+        self._next_check = 0
+        try:
+            # another worker may have used up the nodes already
+            self._check_limits()
+            gamestate.make_move_code(move)
+            score = -self.alphabeta(gamestate, depth - 1, -beta, -alpha, 1)
+        except SearchAborted:
+            return None
+        finally:
+            if self._shared_nodes is not None:
+                self._count_shared_nodes()
+        gamestate.undo_move()
+        return score
+
+    def _count_shared_nodes(self) -> int:
         """
-        Implementation of the alphabeta pruning algorithm
+        Adds the nodes searched since the last call to the count shared by
+        the workers of a parallel search, returns the shared count
+        """
+        with self._shared_nodes.get_lock():
+            self._shared_nodes.value += self.nodes - self._counted_nodes
+            total = self._shared_nodes.value
+        self._counted_nodes = self.nodes
+        return total
+
+    def _check_limits(self):
+        """
+        Raises SearchAborted if the search has run out of time or nodes or has
+        been stopped. Only called every check_interval nodes, or every
+        shared_check_interval nodes in a worker sharing a node count.
+        """
+        self._next_check = self.nodes + self.check_interval
+        if self._shared_nodes is not None and self.node_limit is not None:
+            self._next_check = self.nodes + self.shared_check_interval
+            if self._count_shared_nodes() > self.node_limit:
+                raise SearchAborted()
+        if self._stop_event.is_set():
+            raise SearchAborted()
+        if self._deadline is not None and time.time() >= self._deadline:
+            raise SearchAborted()
+
+    def evaluate(self, gamestate) -> int:
+        """
+        Evaluation of the position from the point of view of the side to move
+        """
+        value = Evaluation.evaluate(gamestate, self.pawn_table)
+        return value if gamestate.player_to_play.lower() == "w" else -value
+
+    def alphabeta(self, gamestate, depth, alpha, beta, ply=0):
+        """
+        Implementation of the alphabeta pruning algorithm in negamax form, so
+        the score is always from the point of view of the side to move
+        (https://www.chessprogramming.org/Alpha-Beta)
 
         Parameters:
             GameState gamestate - the position at the current time
             int depth - the depth of moves still to evaluate
             int alpha - the minimum score
             int beta - the maximum score
+            int ply - the number of moves made since the root
         """
+        self.nodes += 1
+        if self.node_limit is not None and self.nodes > self.node_limit:
+            raise SearchAborted()
+        if self.nodes >= self._next_check:
+            self._check_limits()
+
+        # a position reached again can be repeated until it is a draw, so the
+        # first repetition is scored as one
+        if ply > 0 and (gamestate.halfmove_clock >= 100 or
+                        gamestate.is_repetition()):
+            return 0
+
+        table = self.transposition_table
+        key = gamestate.zobrist_key
+        original_alpha = alpha
+
+        hash_move = None
+        entry = table.probe(key)
+        if entry:
+            entry_depth, flag, score, hash_move = entry
+            if entry_depth >= depth and ply > 0:
+                score = self._score_from_table(score, ply)
+                if flag == TranspositionTable.EXACT:
+                    return score
+                if flag == TranspositionTable.LOWER_BOUND and score >= beta:
+                    return score
+                if flag == TranspositionTable.UPPER_BOUND and score <= alpha:
+                    return score
 
-        # inspiration - https://www.cs.cornell.edu/courses/cs312/2002sp/lectures/rec21.html
         if depth == 0:
-            return Evaluation.evaluate(gamestate)
-
-        if maximising:
-            value = alpha
-            for move in gamestate.get_legal_moves(gamestate.player_to_play):
-                gs = gamestate.clone()
-                move.gamestate = gs
-                gs.make_move(move)
-                value = max(value, AIPlayer.alphabeta(
-                    gs, depth-1, alpha, beta, False))
-                if value >= beta:
-                    break
-                alpha = max(alpha, value)
-            return value
+            return self.quiescence(gamestate, alpha, beta, ply)
+
+        # moves are generated a stage at a time, a cutoff from the hash move
+        # or a capture saves generating the quiet moves
+        orderer = self.move_orderer
+        moves = orderer.staged_moves(gamestate, ply, hash_move)
+
+        best_score = -AIPlayer.INFINITY
+        best_move = None
+        for move_number, move in enumerate(moves):
+            gamestate.make_move_code(move)
+            score = -self.alphabeta(gamestate, depth-1, -beta, -alpha, ply+1)
+            gamestate.undo_move()
+            if score > best_score:
+                best_score = score
+                best_move = move
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        orderer.record_cutoff(gamestate, move, depth, ply,
+                                              move_number)
+                        break
+
+        if best_move is None:
+            # no legal moves
+            if gamestate.check(gamestate.player_to_play):
+                return -AIPlayer.MATE + ply
+            return 0
+
+        if best_score <= original_alpha:
+            flag = TranspositionTable.UPPER_BOUND
+        elif best_score >= beta:
+            flag = TranspositionTable.LOWER_BOUND
         else:
-            value = beta
-            for move in gamestate.get_legal_moves(gamestate.player_to_play):
-                gs = gamestate.clone()
-                move.gamestate = gs
-                gs.make_move(move)
-                value = min(value, AIPlayer.alphabeta(
-                    gs, depth-1, alpha, beta, True))
-                if value <= alpha:
-                    break
-                beta = min(beta, value)
-            return value
+            flag = TranspositionTable.EXACT
+        table.store(key, depth, flag, self._score_to_table(best_score, ply),
+                    best_move)
+        return best_score
+
+    def quiescence(self, gamestate, alpha, beta, ply):
+        """
+        Searches only captures and promotions until the position is quiet so
+        that the evaluation isn't taken in the middle of an exchange
+        (https://www.chessprogramming.org/Quiescence_Search). When the side
+        to move is in check every evasion is searched instead.
+
+        Parameters:
+            GameState gamestate - the position at the current time
+            int alpha - the minimum score
+            int beta - the maximum score
+            int ply - the number of moves made since the root
+        """
+        self.nodes += 1
+        if self.node_limit is not None and self.nodes > self.node_limit:
+            raise SearchAborted()
+        if self.nodes >= self._next_check:
+            self._check_limits()
+
+        colour = gamestate.player_to_play
+        if gamestate.check(colour):
+            # in check there is no standing pat, the side to move has to get
+            # out of check and can't if it is checkmated
+            best_score = -AIPlayer.MATE + ply
+            moves = self.move_orderer.order_moves(
+                gamestate, gamestate.get_legal_move_codes(colour), ply)
+            for move in moves:
+                gamestate.make_move_code(move)
+                score = -self.quiescence(gamestate, -beta, -alpha, ply + 1)
+                gamestate.undo_move()
+                if score > best_score:
+                    best_score = score
+                    if score > alpha:
+                        alpha = score
+                        if alpha >= beta:
+                            break
+            return best_score
+
+        # stand pat, the side to move doesn't have to capture so the score is
+        # at least the static evaluation
+        stand_pat = self.evaluate(gamestate)
+        if stand_pat >= beta:
+            return stand_pat
+        weights = Evaluation.piece_weights
+        promotion_gain = weights["Q"] - weights["P"]
+        # delta pruning, not even winning a queen would raise the score
+        if stand_pat + weights["Q"] + promotion_gain + self.delta_margin < alpha:
+            return stand_pat
+        if stand_pat > alpha:
+            alpha = stand_pat
+
+        moves = gamestate.get_capture_codes(colour)
+        # captures that lose material by static exchange evaluation are
+        # pruned, the side to move can stand pat instead
+        moves = self.move_orderer.order_captures(gamestate, moves, ply)
+        squares = gamestate._squares
+        best_score = stand_pat
+        for move in moves:
+            flags = move >> 12
+            gain = promotion_gain if flags & MoveEncoding.PROMOTION else 0
+            if flags == MoveEncoding.EN_PASSANT:
+                gain += weights["P"]
+            elif flags & MoveEncoding.CAPTURE:
+                gain += weights[squares[move >> 6 & 63]._piece._letter]
+            if stand_pat + gain + self.delta_margin <= alpha:
+                continue
+
+            gamestate.make_move_code(move)
+            score = -self.quiescence(gamestate, -beta, -alpha, ply + 1)
+            gamestate.undo_move()
+            if score > best_score:
+                best_score = score
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+        return best_score
+
+    @staticmethod
+    def _score_to_table(score, ply):
+        """
+        Mate scores are stored relative to the position rather than the root
+        so that they are still right when the position is reached at a
+        different ply
+        """
+        if score > AIPlayer.MATE - 1000:
+            return score + ply
+        if score < -AIPlayer.MATE + 1000:
+            return score - ply
+        return score
+
+    @staticmethod
+    def _score_from_table(score, ply):
+        if score > AIPlayer.MATE - 1000:
+            return score - ply
+        if score < -AIPlayer.MATE + 1000:
+            return score + ply
+        return score
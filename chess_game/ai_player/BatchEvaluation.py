@@ -0,0 +1,167 @@
+from ..Bitboard import Bitboard
+from ..PieceSquareTables import PieceSquareTables
+
+# numpy is only needed for batch evaluation, so the rest of the engine runs
+# without it
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class BatchEvaluation:
+    """
+    Scores many positions at once with numpy, giving the same scores as
+    GameState.score (material plus tapered piece-square tables, from white's
+    point of view, without the pawn structure terms).
+
+    Positions are passed as a board tensor in either of two layouts:
+        N x 64 int8 - the bitboard index + 1 of the piece on each square, 0
+                      for an empty square (see to_boards)
+        N x 12 x 64 - one 0/1 plane per bitboard (see to_planes)
+    Squares are numbered as in GameState._squares, so square x + (y * 8).
+
+    Methods:
+        available() - whether numpy is installed
+        to_boards(positions) - N x 64 tensor from GameStates or FEN strings
+        to_planes(positions) - N x 12 x 64 tensor from GameStates or FEN strings
+        evaluate(boards) - score of every position in either layout
+        evaluate_moves(gamestate, codes) - score after each move
+    """
+    # filled in on first use, (mg, eg, phase) lookups with a row for empty
+    # squares first, and the same without it for the plane layout
+    _board_tables = None
+    _plane_tables = None
+
+    @staticmethod
+    def available() -> bool:
+        return np is not None
+
+    @staticmethod
+    def _require_numpy():
+        if np is None:
+            raise ImportError("numpy is needed for batch evaluation")
+
+    @staticmethod
+    def _tables():
+        if BatchEvaluation._board_tables is None:
+            mg = np.array(PieceSquareTables.mg_values,
+                          dtype=np.int64).reshape(12, 64)
+            eg = np.array(PieceSquareTables.eg_values,
+                          dtype=np.int64).reshape(12, 64)
+            phase = np.array(PieceSquareTables.phase_values, dtype=np.int64)
+            BatchEvaluation._plane_tables = (mg, eg, phase)
+            empty = np.zeros((1, 64), dtype=np.int64)
+            BatchEvaluation._board_tables = (
+                np.concatenate((empty, mg)), np.concatenate((empty, eg)),
+                np.concatenate((np.zeros(1, dtype=np.int64), phase)))
+        return BatchEvaluation._board_tables, BatchEvaluation._plane_tables
+
+    @staticmethod
+    def _fen_board(fen_string: str) -> list:
+        """
+        Piece on each square (bitboard index + 1, 0 for empty) from the piece
+        placement field of a FEN string
+        """
+        board = [0] * 64
+        for y, rank in enumerate(fen_string.split(" ")[0].split("/")):
+            x = 0
+            for char in rank:
+                if char.isnumeric():
+                    x += int(char)
+                    continue
+                index = Bitboard.piece_letters.index(char.upper())
+                if char.islower():
+                    index += 6
+                board[x + (y * 8)] = index + 1
+                x += 1
+        return board
+
+    @staticmethod
+    def _gamestate_board(gamestate) -> list:
+        board = [0] * 64
+        for index, pieces in enumerate(gamestate._piece_lists):
+            for square in pieces:
+                board[square] = index + 1
+        return board
+
+    @staticmethod
+    def to_boards(positions):
+        """
+        Converts positions to an N x 64 int8 tensor
+
+        Parameters:
+            positions - iterable of GameStates and/or FEN strings
+        """
+        BatchEvaluation._require_numpy()
+        rows = [BatchEvaluation._fen_board(position)
+                if isinstance(position, str)
+                else BatchEvaluation._gamestate_board(position)
+                for position in positions]
+        return np.array(rows, dtype=np.int8).reshape(len(rows), 64)
+
+    @staticmethod
+    def to_planes(positions):
+        """
+        Converts positions to an N x 12 x 64 uint8 tensor of 0/1 planes, one
+        per bitboard index
+
+        Parameters:
+            positions - iterable of GameStates and/or FEN strings
+        """
+        boards = BatchEvaluation.to_boards(positions)
+        return (boards[:, np.newaxis, :] ==
+                np.arange(1, 13, dtype=np.int8)[:, np.newaxis]
+                ).astype(np.uint8)
+
+    @staticmethod
+    def evaluate(boards):
+        """
+        Returns an int64 array of the score of each position from white's
+        point of view
+
+        Parameters:
+            boards - N x 64 or N x 12 x 64 tensor (see the class docstring)
+        """
+        BatchEvaluation._require_numpy()
+        boards = np.asarray(boards)
+        board_tables, plane_tables = BatchEvaluation._tables()
+        if boards.ndim == 3:
+            mg, eg, phase = plane_tables
+            planes = boards.astype(np.int64)
+            mg_score = np.tensordot(planes, mg, axes=([1, 2], [0, 1]))
+            eg_score = np.tensordot(planes, eg, axes=([1, 2], [0, 1]))
+            phase_total = planes.sum(axis=2) @ phase
+        else:
+            mg, eg, phase = board_tables
+            pieces = boards.astype(np.intp)
+            squares = np.arange(64)
+            mg_score = mg[pieces, squares].sum(axis=1)
+            eg_score = eg[pieces, squares].sum(axis=1)
+            phase_total = phase[pieces].sum(axis=1)
+
+        # the same blend as PieceSquareTables.taper, numpy's // also rounds
+        # down
+        max_phase = PieceSquareTables.MAX_PHASE
+        phase_total = np.minimum(phase_total, max_phase)
+        return (mg_score * phase_total + eg_score * (max_phase - phase_total)
+                ) // max_phase
+
+    @staticmethod
+    def evaluate_moves(gamestate, codes):
+        """
+        Returns an int64 array of the score from white's point of view after
+        each move, making and undoing each one to read the board
+
+        Parameters:
+            GameState gamestate - the position the moves are made from
+            list codes - MoveEncoding codes of moves in the position
+        """
+        BatchEvaluation._require_numpy()
+        rows = []
+        for code in codes:
+            gamestate.make_move_code(code)
+            rows.append(BatchEvaluation._gamestate_board(gamestate))
+            gamestate.undo_move()
+        return BatchEvaluation.evaluate(
+            np.array(rows, dtype=np.int8).reshape(len(rows), 64))
@@ -1,96 +1,167 @@
+from ..Bitboard import Bitboard
+from ..PieceSquareTables import PieceSquareTables
 
 
 class Evaluation:
-    piece_weights = {"P": 200, "N": 400,
-                     "B": 640, "R": 958,
-                     "Q": 1858, "K": 120000}
-    tables = {
-        "P": ((0,   0,   0,   0,   0,   0,   0,   0),
-              (78,  83,  86,  73, 102,  82,  85,  90),
-              (7,  29,  21,  44,  40,  31,  44,   7),
-              (-17,  16,  -2,  15,  14,   0,  15, -13),
-              (-26,   3,  10,   9,   6,   1,   0, -23),
-              (-22,   9,   5, -11, -10,  -2,   3, -19),
-              (-31,   8,  -7, -37, -36, -14,   3, -31),
-              (0,   0,   0,   0,   0,   0,   0,   0)),
-        "N": ((-66, -53, -75, -75, -10, -55, -58, -70),
-              (-3,  -6, 100, -36,   4,  62,  -4, -14),
-              (10,  67,   1,  74,  73,  27,  62,  -2),
-              (24,  24,  45,  37,  33,  41,  25,  17),
-              (-1,   5,  31,  21,  22,  35,   2,   0),
-              (-18,  10,  13,  22,  18,  15,  11, -14),
-              (-23, -15,   2,   0,   2,   0, -23, -20),
-              (-74, -23, -26, -24, -19, -35, -22, -69)),
-        "B": ((-59, -78, -82, -76, -23, -107, -37, -50),
-              (-11,  20,  35, -42, -39,  31,   2, -22),
-              (-9,  39, -32,  41,  52, -10,  28, -14),
-              (25,  17,  20,  34,  26,  25,  15,  10),
-              (13,  10,  17,  23,  17,  16,   0,   7),
-              (14,  25,  24,  15,   8,  25,  20,  15),
-              (19,  20,  11,   6,   7,   6,  20,  16),
-              (-7,   2, -15, -12, -14, -15, -10, -10)),
-        "R": ((35,  29,  33,   4,  37,  33,  56,  50),
-              (55,  29,  56,  67,  55,  62,  34,  60),
-              (19,  35,  28,  33,  45,  27,  25,  15),
-              (0,   5,  16,  13,  18,  -4,  -9,  -6),
-              (-28, -35, -16, -21, -13, -29, -46, -30),
-              (-42, -28, -42, -25, -25, -35, -26, -46),
-              (-53, -38, -31, -26, -29, -43, -44, -53),
-              (-30, -24, -18,   5,  -2, -18, -31, -32)),
-        "K": ((4,  54,  47, -99, -99,  60,  83, -62),
-              (-32,  10,  55,  56,  56,  55,  10,   3),
-              (-62,  12, -57,  44, -67,  28,  37, -31),
-              (-55,  50,  11,  -4, -19,  13,   0, -49),
-              (-55, -43, -52, -28, -51, -47,  -8, -50),
-              (-47, -42, -43, -79, -64, -32, -29, -32),
-              (-4,   3, -14, -50, -57, -18,  13,   4),
-              (17,  30,  -3, -14,   6,  -1,  40,  18)),
-        "Q": ((6,   1,  -8, -104,  69,  24,  88,   26),
-              (14,  32,  60, -10,  20,  76,  57,   24),
-              (-2,  43,  32,  60,  72,  63,  43,    2),
-              (1, -16,  22,  17,  25,  20, -13,    -6),
-              (-14, -15,  -2,  -5,  -1, -10, -20, -22),
-              (-30,  -6, -13, -11, -16, -11, -16, -27),
-              (-36, -18,   0, -19, -15, -15, -21, -38),
-              (-39, -30, -31, -13, -31, -36, -34, -42))
-    }
+    """
+    Static evaluation of a position from white's point of view, the material
+    of each side plus a piece-square table bonus for each piece, tapered
+    between a middlegame and an endgame table by the material left on the
+    board (https://www.chessprogramming.org/Tapered_Eval).
+
+    The weights and tables are those of PieceSquareTables, repeated here as
+    class attributes. GameState keeps the middlegame and endgame scores and
+    the phase as running totals, adding or taking away a piece's entries as
+    it is put on or taken off a square, so evaluate doesn't have to look at
+    the board.
+    total_material_value and total_position_value work it out from scratch.
+
+    Doubled, isolated and passed pawns are scored on top of that by
+    pawn_structure, which only depends on the pawns so its result can be
+    cached in a PawnTable keyed by GameState.pawn_key.
+    """
+    piece_weights = PieceSquareTables.piece_weights
+    phase_weights = PieceSquareTables.phase_weights
+    MAX_PHASE = PieceSquareTables.MAX_PHASE
+    tables = PieceSquareTables.tables
+    endgame_tables = PieceSquareTables.endgame_tables
+    mg_values = PieceSquareTables.mg_values
+    eg_values = PieceSquareTables.eg_values
+    phase_values = PieceSquareTables.phase_values
+    taper = staticmethod(PieceSquareTables.taper)
+
+    # (middlegame, endgame) penalties for each extra pawn on a file and each
+    # pawn with no pawns of its colour on the files next to it
+    doubled_penalty = (20, 40)
+    isolated_penalty = (20, 30)
+    # (middlegame, endgame) bonus for a passed pawn, by how many ranks it
+    # has moved up the board
+    passed_bonus = ((0, 0), (5, 10), (10, 20), (20, 40),
+                    (35, 70), (60, 120), (100, 200), (0, 0))
+    # filled in below the class, indexed by file
+    file_masks = ()
+    adjacent_file_masks = ()
+    # squares that must have no enemy pawns for a pawn to be passed, every
+    # square ahead of it on its own and the next files, indexed by colour
+    # then square
+    passed_masks = ()
+    # every square ahead of a pawn on its own file, indexed by colour then
+    # square, only the front pawn of a file can be passed
+    front_masks = ()
 
     @staticmethod
-    def evaluate(gamestate):
-        material_value = Evaluation.total_material_value(gamestate)
-        position_value = Evaluation.total_position_value(gamestate)
+    def evaluate(gamestate, pawn_table=None):
+        """
+        Evaluation of the position from white's point of view
 
-        return material_value + position_value
+        Parameters:
+            GameState gamestate - the position to evaluate
+            PawnTable pawn_table - cache of pawn structure scores, or None to
+                                   work them out every time
+        """
+        bitboards = gamestate._bitboards
+        if pawn_table is None:
+            pawn_mg, pawn_eg = Evaluation.pawn_structure(
+                bitboards[Bitboard.PAWN], bitboards[Bitboard.PAWN + 6])
+        else:
+            key = gamestate.pawn_key
+            entry = pawn_table.probe(key)
+            if entry is None:
+                entry = Evaluation.pawn_structure(
+                    bitboards[Bitboard.PAWN], bitboards[Bitboard.PAWN + 6])
+                pawn_table.store(key, entry)
+            pawn_mg, pawn_eg = entry
+        return Evaluation.taper(gamestate._mg_score + pawn_mg,
+                                gamestate._eg_score + pawn_eg,
+                                gamestate._phase)
+
+    @staticmethod
+    def pawn_structure(white_pawns: int, black_pawns: int) -> tuple:
+        """
+        Returns the (middlegame, endgame) score for doubled, isolated and
+        passed pawns from white's point of view
+
+        Parameters:
+            int white_pawns - bitboard of the white pawns
+            int black_pawns - bitboard of the black pawns
+        """
+        mg_total = 0
+        eg_total = 0
+        for colour, pawns, enemy_pawns, sign in (
+                (Bitboard.WHITE, white_pawns, black_pawns, 1),
+                (Bitboard.BLACK, black_pawns, white_pawns, -1)):
+            for file in range(8):
+                count = Bitboard.popcount(pawns & Evaluation.file_masks[file])
+                if not count:
+                    continue
+                if count > 1:
+                    mg_total -= sign * Evaluation.doubled_penalty[0] * (
+                        count - 1)
+                    eg_total -= sign * Evaluation.doubled_penalty[1] * (
+                        count - 1)
+                if not pawns & Evaluation.adjacent_file_masks[file]:
+                    mg_total -= sign * Evaluation.isolated_penalty[0] * count
+                    eg_total -= sign * Evaluation.isolated_penalty[1] * count
+
+            passed_masks = Evaluation.passed_masks[colour]
+            front_masks = Evaluation.front_masks[colour]
+            for square in Bitboard.squares(pawns):
+                if not (enemy_pawns & passed_masks[square] or
+                        pawns & front_masks[square]):
+                    # white pawns move towards y = 0
+                    ranks = (7 - (square >> 3) if colour == Bitboard.WHITE
+                             else square >> 3)
+                    mg_total += sign * Evaluation.passed_bonus[ranks][0]
+                    eg_total += sign * Evaluation.passed_bonus[ranks][1]
+        return mg_total, eg_total
 
     @staticmethod
     def total_material_value(gamestate):
         white_total = 0
         black_total = 0
-        pieces = [s.get_piece() for s
-                  in gamestate._squares if s.get_piece()]
+        bitboards = gamestate._bitboards
 
-        for piece in pieces:
-            if piece.colour.upper() == "W":
-                white_total += Evaluation.piece_weights[piece.letter.upper()]
-            elif piece.colour.upper() == "B":
-                black_total += Evaluation.piece_weights[piece.letter.upper()]
+        for index, letter in enumerate(Bitboard.piece_letters):
+            weight = Evaluation.piece_weights[letter]
+            white_total += weight * Bitboard.popcount(bitboards[index])
+            black_total += weight * Bitboard.popcount(bitboards[index + 6])
 
         return white_total - black_total
 
     @staticmethod
     def total_position_value(gamestate):
-        white_total = 0
-        black_total = 0
-        pieces = [s.get_piece() for s
-                  in gamestate._squares if s.get_piece()]
+        mg_total = 0
+        eg_total = 0
+        phase = 0
+        bitboards = gamestate._bitboards
 
-        for piece in pieces:
-            tbl = Evaluation.tables[piece.letter.upper()]
-            value = tbl[piece.position[0]][piece.position[1]]
+        for index, letter in enumerate(Bitboard.piece_letters):
+            mg_tbl = Evaluation.tables[letter]
+            eg_tbl = Evaluation.endgame_tables.get(letter, mg_tbl)
+            for square in Bitboard.squares(bitboards[index]):
+                mg_total += mg_tbl[square >> 3][square & 7]
+                eg_total += eg_tbl[square >> 3][square & 7]
+            for square in Bitboard.squares(bitboards[index + 6]):
+                mg_total -= mg_tbl[7 - (square >> 3)][square & 7]
+                eg_total -= eg_tbl[7 - (square >> 3)][square & 7]
+            phase += Evaluation.phase_weights[letter] * Bitboard.popcount(
+                bitboards[index] | bitboards[index + 6])
 
-            if piece.colour.upper() == "W":
-                white_total += value
-            elif piece.colour.upper() == "B":
-                black_total += value
+        return Evaluation.taper(mg_total, eg_total, phase)
 
-        return white_total - black_total
+
+Evaluation.file_masks = tuple(Bitboard.FILE_A << file for file in range(8))
+Evaluation.adjacent_file_masks = tuple(
+    (Evaluation.file_masks[file - 1] if file > 0 else 0) |
+    (Evaluation.file_masks[file + 1] if file < 7 else 0) for file in range(8))
+Evaluation.passed_masks = tuple(
+    tuple(sum(1 << (x + y * 8) for x in range(max(0, (square & 7) - 1),
+                                                min(7, (square & 7) + 1) + 1)
+              for y in (range(square >> 3) if colour == Bitboard.WHITE
+                        else range((square >> 3) + 1, 8)))
+          for square in range(64))
+    for colour in (Bitboard.WHITE, Bitboard.BLACK))
+Evaluation.front_masks = tuple(
+    tuple(passed_mask & Evaluation.file_masks[square & 7]
+          for square, passed_mask in enumerate(passed_masks))
+    for passed_masks in Evaluation.passed_masks)
@@ -0,0 +1,65 @@
+class HashTable:
+    """
+    Base of the fixed size tables keyed by a position's hash, holding the
+    sizing and the probe statistics. Subclasses set entry_size and
+    bucket_size and do their own probing and storing, counting into the
+    statistics named in stat_names.
+
+    Keys and entries are kept in two lists of bucket_size slots per bucket,
+    a bucket being chosen by key % _bucket_count.
+
+    Methods:
+        clear()
+        get_stats()
+    """
+    # rough number of bytes used by one entry, set by each subclass
+    entry_size = 128
+    # entries per bucket
+    bucket_size = 1
+    # overwrites are stores that replaced another position's entry
+    stat_names = ("probes", "hits", "stores", "overwrites")
+
+    def __init__(self, size_bytes: int):
+        """
+        Parameters:
+            int size_bytes - memory budget for the table in bytes
+        """
+        self._bucket_count = self._buckets_for(size_bytes)
+        self.clear()
+
+    def _buckets_for(self, size_bytes: int) -> int:
+        return max(1, size_bytes // (self.bucket_size * self.entry_size))
+
+    def _reset_stats(self):
+        for name in self.stat_names:
+            setattr(self, name, 0)
+
+    def clear(self):
+        """
+        Empties the table and resets the statistics
+        """
+        self._keys = [None] * (self.bucket_size * self._bucket_count)
+        self._entries = [None] * (self.bucket_size * self._bucket_count)
+        self._reset_stats()
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / self.probes if self.probes else 0.0
+
+    def _entry_count(self) -> int:
+        return sum(1 for k in self._keys if k is not None)
+
+    def _capacity(self) -> int:
+        return len(self._keys)
+
+    def get_stats(self) -> dict:
+        """
+        Returns a dict of each statistic in stat_names since the table was
+        cleared, the hit rate, and the number of entries used out of the
+        table's capacity
+        """
+        stats = {name: getattr(self, name) for name in self.stat_names}
+        stats["hit_rate"] = self.hit_rate
+        stats["entries"] = self._entry_count()
+        stats["capacity"] = self._capacity()
+        return stats
@@ -0,0 +1,227 @@
+from ..Bitboard import Bitboard
+from ..MoveEncoding import MoveEncoding
+from ..MoveGenerator import MoveGenerator
+
+
+class MoveOrderer:
+    """
+    Orders moves so that alpha-beta search looks at the moves most likely to
+    cause a cutoff first (https://www.chessprogramming.org/Move_Ordering).
+    Moves are MoveEncoding codes.
+
+    Order:
+        1. the hash move (best move from the transposition table)
+        2. captures and promotions that don't lose material by static
+           exchange evaluation, most valuable victim first and then least
+           valuable attacker (MVV-LVA)
+        3. killer moves, quiet moves that caused a cutoff at the same ply
+        4. other quiet moves by their history score, how often and how deep
+           they have caused cutoffs
+        5. captures that lose material, by MVV-LVA
+
+    order_moves sorts a full list of moves, staged_moves generates the moves
+    in the same order a stage at a time so that when the first moves cause a
+    cutoff the later stages are never generated.
+
+    Properties:
+        cutoffs - the number of beta cutoffs recorded
+        first_move_cutoffs - the number of those caused by the first move
+    """
+    HASH_MOVE_SCORE = 1 << 30
+    CAPTURE_SCORE = 1 << 28
+    KILLER_SCORE = 1 << 26
+    # below every history score
+    LOSING_CAPTURE_SCORE = -(1 << 28)
+    # the value of each piece type for MVV-LVA, indexed like Bitboard
+    piece_values = (1, 3, 3, 5, 9, 20)
+    killers_per_ply = 2
+
+    def __init__(self, max_ply=128):
+        self.max_ply = max_ply
+        self.killers = [[None] * self.killers_per_ply for i in range(max_ply)]
+        # indexed by colour * 4096 + from square + (to square * 64)
+        self.history = [0] * (2 * 4096)
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+
+    def new_search(self):
+        """
+        Called at the start of each search. Killers are forgotten and the
+        history scores are halved so older results count for less.
+        """
+        self.killers = [[None] * self.killers_per_ply
+                        for i in range(self.max_ply)]
+        self.history = [h >> 1 for h in self.history]
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+
+    @property
+    def first_move_cutoff_rate(self) -> float:
+        """
+        The fraction of cutoffs caused by the first move searched, the closer
+        to 1 the better the ordering
+        """
+        if not self.cutoffs:
+            return 0.0
+        return self.first_move_cutoffs / self.cutoffs
+
+    def order_moves(self, gamestate, moves, ply, hash_move=None):
+        """
+        Returns the moves sorted best first
+
+        Parameters:
+            GameState gamestate - the position the moves are for
+            array moves - codes of the legal moves
+            int ply - distance from the root of the search
+            int hash_move - code of the best move from the transposition
+                            table or None
+        """
+        return [move for score, index, move in
+                self._scored_moves(gamestate, moves, ply, hash_move)]
+
+    def order_captures(self, gamestate, moves, ply):
+        """
+        Returns the captures and promotions that don't lose material by
+        static exchange evaluation, sorted best first. Losing ones are left
+        out.
+
+        Parameters:
+            GameState gamestate - the position the moves are for
+            array moves - codes of legal captures and promotions
+            int ply - distance from the root of the search
+        """
+        return [move for score, index, move in
+                self._scored_moves(gamestate, moves, ply) if score >= 0]
+
+    def _scored_moves(self, gamestate, moves, ply, hash_move=None):
+        """
+        order_moves returning (score, -index, move) tuples
+        """
+        killers = self.killers[ply] if ply < self.max_ply else ()
+        colour_offset = 4096 if gamestate.player_to_play.lower() == "b" else 0
+        history = self.history
+        values = self.piece_values
+        squares = gamestate._squares
+        scored = []
+        for index, move in enumerate(moves):
+            flags = move >> 12
+            if move == hash_move:
+                score = self.HASH_MOVE_SCORE
+            elif flags & MoveEncoding.CAPTURE:
+                if flags == MoveEncoding.EN_PASSANT:
+                    victim = Bitboard.PAWN
+                else:
+                    victim = squares[move >> 6 & 63]._piece._type_index
+                attacker = squares[move & 63]._piece._type_index
+                # a capture can only lose material if the attacker is worth
+                # more than the victim
+                if (values[attacker] > values[victim] and
+                        gamestate.see(move) < 0):
+                    score = self.LOSING_CAPTURE_SCORE
+                else:
+                    score = self.CAPTURE_SCORE
+                score += values[victim] * 64 - values[attacker]
+            elif flags & MoveEncoding.PROMOTION:
+                score = (self.LOSING_CAPTURE_SCORE if gamestate.see(move) < 0
+                         else self.CAPTURE_SCORE)
+            elif move in killers:
+                score = self.KILLER_SCORE - killers.index(move)
+            else:
+                score = history[colour_offset + (move & 4095)]
+            scored.append((score, -index, move))
+        scored.sort(reverse=True)
+        return scored
+
+    def staged_moves(self, gamestate, ply, hash_move=None):
+        """
+        Generator of the legal moves of the side to move in the same order as
+        order_moves, each stage is only generated once the moves before it
+        have been searched
+
+        Parameters:
+            GameState gamestate - the position to generate moves for, must be
+                                  the same position whenever the generator is
+                                  resumed
+            int ply - distance from the root of the search
+            int hash_move - code of the best move from the transposition
+                            table or None
+        """
+        colour = gamestate.player_to_play
+        generate = MoveGenerator.legal_move_codes
+        analysis = MoveGenerator.checks_and_pins(gamestate, colour)
+
+        # 1. the hash move, checked to be legal as a different position can
+        # share the entry
+        if hash_move is not None and hash_move in generate(
+                gamestate, colour, from_mask=1 << (hash_move & 63),
+                analysis=analysis):
+            yield hash_move
+        else:
+            hash_move = None
+
+        # 2. captures and promotions, keeping the losing ones for last
+        captures = generate(gamestate, colour, get_castling_moves=False,
+                            captures_only=True, analysis=analysis)
+        losing_captures = []
+        for score, index, move in self._scored_moves(gamestate, captures,
+                                                     ply):
+            if move == hash_move:
+                continue
+            if score < 0:
+                losing_captures.append(move)
+            else:
+                yield move
+
+        # 3. killers, which were legal in another position at this ply
+        killers = self.killers[ply] if ply < self.max_ply else ()
+        searched = [hash_move]
+        for move in killers:
+            if move is None or move in searched:
+                continue
+            if move in generate(gamestate, colour,
+                                from_mask=1 << (move & 63),
+                                quiets_only=True, analysis=analysis):
+                searched.append(move)
+                yield move
+
+        # 4. the other quiet moves by history
+        quiets = generate(gamestate, colour, quiets_only=True,
+                          analysis=analysis)
+        colour_offset = 4096 if colour.lower() == "b" else 0
+        history = self.history
+        scored = [(history[colour_offset + (move & 4095)], -index, move)
+                  for index, move in enumerate(quiets)
+                  if move not in searched]
+        scored.sort(reverse=True)
+        for score, index, move in scored:
+            yield move
+
+        # 5. captures and promotions that lose material
+        for move in losing_captures:
+            yield move
+
+    def record_cutoff(self, gamestate, move, depth, ply, move_number):
+        """
+        Records a move that caused a beta cutoff. Should be called with the
+        move undone.
+
+        Parameters:
+            GameState gamestate - the position the move was played in
+            int move - code of the move that caused the cutoff
+            int depth - the remaining depth when it was searched
+            int ply - distance from the root of the search
+            int move_number - the index of the move in the ordered list
+        """
+        self.cutoffs += 1
+        if move_number == 0:
+            self.first_move_cutoffs += 1
+        if move >> 12 & (MoveEncoding.CAPTURE | MoveEncoding.PROMOTION):
+            return
+
+        if ply < self.max_ply:
+            killers = self.killers[ply]
+            if killers[0] != move:
+                killers.pop()
+                killers.insert(0, move)
+        colour_offset = 4096 if gamestate.player_to_play.lower() == "b" else 0
+        self.history[colour_offset + (move & 4095)] += depth * depth
@@ -0,0 +1,263 @@
+import concurrent.futures
+import multiprocessing
+
+from ..GameState import GameState
+from .SharedTranspositionTable import SharedTranspositionTable
+
+# the searcher and shared values of a worker process, set by _init_worker
+_worker = {}
+
+
+def _init_worker(searcher_class, tt_size_mb, shared_alpha, shared_nodes,
+                 stop_event):
+    """
+    Runs once in each worker process. Each worker keeps its own searcher, so
+    its transposition table and move ordering carry over between the moves it
+    is given.
+    """
+    searcher = searcher_class("w", tt_size_mb=tt_size_mb)
+    searcher._stop_event = stop_event
+    searcher._shared_nodes = shared_nodes
+    _worker["searcher"] = searcher
+    _worker["alpha"] = shared_alpha
+
+
+def _search_move(fen, hash_history, move, depth, beta, deadline, node_limit):
+    """
+    Searches one root move in a worker process, returns a tuple of
+    (move, score or None if the search was stopped, nodes searched)
+
+    Parameters:
+        string fen - the root position
+        list hash_history - keys of the positions before the root that it
+                            could repeat
+        int move - code of the root move to search
+        int depth - depth of the search from the root
+        int beta - the maximum score
+        float deadline - time.time() the search must stop by, or None
+        int node_limit - positions allowed for all the root moves together,
+                         or None
+    """
+    searcher = _worker["searcher"]
+    shared_alpha = _worker["alpha"]
+    gamestate = GameState(fen_string=fen, hash_history=hash_history)
+    # the best score found by any worker so far is the lower bound
+    alpha = shared_alpha.value
+    score = searcher.search_root_move(gamestate, move, depth, alpha, beta,
+                                      deadline, node_limit)
+    if score is not None and score > alpha:
+        with shared_alpha.get_lock():
+            if score > shared_alpha.value:
+                shared_alpha.value = score
+    return move, score, searcher.nodes
+
+
+def _init_lazy_smp_worker(searcher_class, tt_size_mb, table_name,
+                          shared_nodes, stop_event):
+    """
+    Runs once in each Lazy SMP helper process, the helper's searcher uses the
+    shared transposition table rather than one of its own
+    """
+    searcher = searcher_class("w", tt_size_mb=0)
+    searcher.transposition_table = SharedTranspositionTable(
+        tt_size_mb, name=table_name)
+    searcher._stop_event = stop_event
+    searcher._shared_nodes = shared_nodes
+    _worker["searcher"] = searcher
+
+
+def _lazy_smp_helper(fen, hash_history, first_depth, max_depth, deadline,
+                     node_limit):
+    """
+    Searches the root position in a helper process until it is stopped,
+    returns the number of nodes searched
+    """
+    return _worker["searcher"].search_helper(
+        GameState(fen_string=fen, hash_history=hash_history), first_depth,
+        max_depth, deadline, node_limit)
+
+
+class ParallelSearch:
+    """
+    Searches root moves in a pool of worker processes (threads would be held
+    back by the GIL). Positions are sent to the workers as FEN strings, with
+    the keys of the positions before them that they could repeat, and the
+    best score found so far is shared between them so that every worker can
+    use it as alpha. The number of nodes searched is shared too, so the
+    workers stop once they have used the node limit between them.
+
+    Methods:
+        ParallelSearch(searcher_class, workers, tt_size_mb) (constructor)
+        search_root(gamestate, moves, depth, alpha, beta, deadline,
+                    node_limit) - searches the moves in parallel
+        stop() - stops the workers' searches
+        close() - shuts down the worker processes
+    """
+
+    def __init__(self, searcher_class, workers, tt_size_mb=16):
+        """
+        Parameters:
+            type searcher_class - class with a search_root_move method,
+                                  created in each worker
+            int workers - the number of worker processes
+            int tt_size_mb - size of each worker's transposition table
+        """
+        self.searcher_class = searcher_class
+        self.workers = workers
+        self.tt_size_mb = tt_size_mb
+        self._context = multiprocessing.get_context()
+        self._alpha = self._context.Value("q", 0)
+        self._nodes = self._context.Value("q", 0)
+        self._stop_event = self._context.Event()
+        self._executor = None
+
+    def _get_executor(self):
+        # the processes are started the first time they are needed and then
+        # kept for the rest of the game
+        if self._executor is None:
+            self._executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=self._context,
+                initializer=_init_worker,
+                initargs=(self.searcher_class, self.tt_size_mb, self._alpha,
+                          self._nodes, self._stop_event))
+        return self._executor
+
+    def search_root(self, gamestate, moves, depth, alpha, beta,
+                    deadline=None, node_limit=None) -> list:
+        """
+        Searches each move from the root position in the worker processes,
+        returns a list of (move, score, nodes) in the order of the moves.
+        The score is None if the search of that move was stopped, and is only
+        an upper bound if it is not above the alpha the worker searched with.
+
+        Parameters:
+            GameState gamestate - the root position
+            list moves - codes of the root moves to search
+            int depth - depth of the search from the root
+            int alpha - the minimum score
+            int beta - the maximum score
+            float deadline - time.time() the search must stop by, or None
+            int node_limit - positions allowed for all the moves together,
+                             or None
+        """
+        fen = gamestate.generate_fen(include_clocks=True)
+        hash_history = gamestate.repetition_history()
+        self._alpha.value = alpha
+        self._nodes.value = 0
+        self._stop_event.clear()
+        executor = self._get_executor()
+        futures = [executor.submit(_search_move, fen, hash_history, move,
+                                   depth, beta, deadline, node_limit)
+                   for move in moves]
+        return [future.result() for future in futures]
+
+    def stop(self):
+        """
+        Stops the searches running in the workers, safe to call from another
+        thread
+        """
+        self._stop_event.set()
+
+    def close(self):
+        """
+        Shuts down the worker processes
+        """
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+
+class LazySMPSearch:
+    """
+    Lazy SMP (https://www.chessprogramming.org/Lazy_SMP), helper processes
+    search the same root position as the main search at staggered depths and
+    share one transposition table with it. The helpers' results are only
+    used through the table, where they let the main search cut off sooner.
+    The number of nodes searched is shared by the helpers and the main search
+    (through shared_nodes), so they stop once they have used the node limit
+    between them.
+
+    Methods:
+        LazySMPSearch(searcher_class, workers, table) (constructor)
+        start(gamestate, depth, deadline, node_limit) - starts the helpers
+        finish() - stops the helpers, returns the nodes they searched
+        stop() - stops the helpers' searches
+        close() - shuts down the helper processes
+    """
+
+    def __init__(self, searcher_class, workers, table):
+        """
+        Parameters:
+            type searcher_class - class with a search_helper method, created
+                                  in each helper
+            int workers - the number of processes searching, including the
+                          main search, so there are workers - 1 helpers
+            SharedTranspositionTable table - the table used by the main search
+        """
+        self.searcher_class = searcher_class
+        self.helpers = workers - 1
+        self.table = table
+        self._context = multiprocessing.get_context()
+        self.shared_nodes = self._context.Value("q", 0)
+        self._stop_event = self._context.Event()
+        self._executor = None
+        self._futures = []
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.helpers, mp_context=self._context,
+                initializer=_init_lazy_smp_worker,
+                initargs=(self.searcher_class, self.table.size_mb,
+                          self.table.name, self.shared_nodes,
+                          self._stop_event))
+        return self._executor
+
+    def start(self, gamestate, depth, deadline=None, node_limit=None):
+        """
+        Starts the helpers searching a position, every other helper starts a
+        depth further on and searches one depth deeper than the main search
+        so the helpers aren't all searching the same tree at the same time
+
+        Parameters:
+            GameState gamestate - the root position
+            int depth - the depth of the main search
+            float deadline - time.time() the search must stop by, or None
+            int node_limit - positions allowed for the helpers and the main
+                             search together, or None
+        """
+        fen = gamestate.generate_fen(include_clocks=True)
+        hash_history = gamestate.repetition_history()
+        self.shared_nodes.value = 0
+        self._stop_event.clear()
+        executor = self._get_executor()
+        self._futures = [
+            executor.submit(_lazy_smp_helper, fen, hash_history,
+                            1 + helper % 2, depth + helper % 2, deadline,
+                            node_limit)
+            for helper in range(self.helpers)]
+
+    def finish(self) -> int:
+        """
+        Stops the helpers and waits for them, returns the number of nodes
+        they searched
+        """
+        self._stop_event.set()
+        nodes = sum(future.result() for future in self._futures)
+        self._futures = []
+        return nodes
+
+    def stop(self):
+        """
+        Stops the helpers' searches, safe to call from another thread
+        """
+        self._stop_event.set()
+
+    def close(self):
+        """
+        Shuts down the helper processes
+        """
+        if self._executor is not None:
+            self._stop_event.set()
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,59 @@
+from .HashTable import HashTable
+
+
+class PawnTable(HashTable):
+    """
+    Fixed size cache of pawn structure scores keyed by a position's pawn key
+    (https://www.chessprogramming.org/Pawn_Hash_Table).
+
+    Pawns move on only a small share of moves, so most positions the search
+    visits have a pawn structure it has already scored. Each key has one
+    slot and a new entry always replaces the old one.
+
+    Entries are tuples of (middlegame score, endgame score).
+
+    Methods:
+        PawnTable(size_kb: int) (constructor)
+        probe(key: int) - returns the entry for a key or None
+        store(key, entry)
+        clear()
+        get_stats()
+    """
+    # rough number of bytes used by one entry, a key slot and an entry slot
+    # plus the key and the (middlegame, endgame) tuple of two small ints
+    entry_size = 112
+
+    def __init__(self, size_kb=1024):
+        """
+        Parameters:
+            int size_kb - memory budget for the table in kilobytes
+        """
+        self.size_kb = size_kb
+        super().__init__(size_kb * 1024)
+
+    def probe(self, key: int):
+        """
+        Returns the entry stored for a key or None
+
+        Parameters:
+            int key - pawn key of the position
+        """
+        self.probes += 1
+        index = key % self._bucket_count
+        if self._keys[index] == key:
+            self.hits += 1
+            return self._entries[index]
+        return None
+
+    def store(self, key: int, entry: tuple):
+        """
+        Parameters:
+            int key - pawn key of the position
+            tuple entry - (middlegame score, endgame score)
+        """
+        self.stores += 1
+        index = key % self._bucket_count
+        if self._keys[index] is not None and self._keys[index] != key:
+            self.overwrites += 1
+        self._keys[index] = key
+        self._entries[index] = entry
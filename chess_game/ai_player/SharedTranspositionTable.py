@@ -0,0 +1,162 @@
+from multiprocessing import shared_memory
+
+from .TranspositionTable import TranspositionTable
+
+
+class SharedTranspositionTable(TranspositionTable):
+    """
+    Transposition table held in shared memory so that every process of a
+    parallel search can read and write the same results. It has the same
+    buckets and replacement scheme as TranspositionTable.
+
+    Entries are packed into two 64 bit words, the key XOR the data and the
+    data. There are no locks so a process may read an entry while another
+    is half way through writing it, but then the words won't XOR back to
+    the key and the entry is treated as missing
+    (https://www.chessprogramming.org/Shared_Hash_Table#Lockless).
+
+    Data is packed as:
+        bits 0-15 best move code (no_move if there isn't one)
+        bits 16-17 flag
+        bits 18-25 depth
+        bits 26-57 score + score_offset
+        bit 63 set for every entry so an empty slot is never a match
+
+    Methods:
+        SharedTranspositionTable(size_mb: int, name: str) (constructor)
+        probe(key: int) - returns the entry for a key or None
+        store(key, depth, flag, score, best_move)
+        clear()
+        close() - detaches from the shared memory
+    """
+    entry_size = 16
+    # a8 to a8, which is never a move
+    no_move = 0
+    score_offset = 1 << 31
+    _used = 1 << 63
+
+    def __init__(self, size_mb=16, name=None):
+        """
+        Parameters:
+            int size_mb - memory budget for the table in megabytes
+            string name - name of an existing table's shared memory to use,
+                          or None to create a new table
+        """
+        self.size_mb = size_mb
+        self._bucket_count = self._buckets_for(size_mb * 1024 * 1024)
+        size = self._bucket_count * self.bucket_size * self.entry_size
+        self._owner = name is None
+        if self._owner:
+            self._memory = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self._memory = shared_memory.SharedMemory(name=name)
+        self.name = self._memory.name
+        # four words per bucket, key ^ data and data for each entry
+        self._words = self._memory.buf[:size].cast("Q")
+        if self._owner:
+            self.clear()
+        else:
+            self._reset_stats()
+
+    def clear(self):
+        """
+        Empties the table and resets this process's statistics
+        """
+        self._memory.buf[:len(self._words) * 8] = bytes(len(self._words) * 8)
+        self._reset_stats()
+
+    def close(self):
+        """
+        Detaches from the shared memory, which is freed when the process that
+        created the table closes it
+        """
+        if self._words is None:
+            return
+        self._words.release()
+        self._words = None
+        self._memory.close()
+        if self._owner:
+            self._memory.unlink()
+
+    def _pack(self, depth, flag, score, best_move):
+        if best_move is None:
+            best_move = self.no_move
+        return (self._used | (score + self.score_offset) << 26 |
+                depth << 18 | flag << 16 | best_move)
+
+    def _unpack(self, data):
+        best_move = data & 0xFFFF
+        return (data >> 18 & 0xFF, data >> 16 & 3,
+                (data >> 26 & 0xFFFFFFFF) - self.score_offset,
+                None if best_move == self.no_move else best_move)
+
+    def probe(self, key: int):
+        """
+        Returns the entry stored for a key or None
+
+        Parameters:
+            int key - zobrist key of the position
+        """
+        self.probes += 1
+        index = (key % self._bucket_count) * 4
+        words = self._words
+        for i in (index, index + 2):
+            data = words[i + 1]
+            if data and words[i] ^ data == key:
+                self.hits += 1
+                return self._unpack(data)
+        if words[index + 1]:
+            # the bucket holds other positions
+            self.collisions += 1
+        return None
+
+    def store(self, key: int, depth: int, flag: int, score: int, best_move):
+        """
+        Stores a search result, in the depth-preferred entry of its bucket if
+        it was searched at least as deep as the result already there (or is
+        the same position), otherwise in the always-replace entry.
+
+        Parameters:
+            int key - zobrist key of the position
+            int depth - depth the position was searched to
+            int flag - EXACT, LOWER_BOUND or UPPER_BOUND
+            int score - the score found by the search
+            best_move - code of the best move, or None
+        """
+        self.stores += 1
+        index = (key % self._bucket_count) * 4
+        words = self._words
+        data = words[index + 1]
+        old_key = words[index] ^ data if data else None
+        if old_key is None or old_key == key or data >> 18 & 0xFF <= depth:
+            if old_key == key and best_move is None:
+                # keep the move from the last time the position was searched
+                best_move = self._unpack(data)[3]
+            # the old depth-preferred entry moves to the always-replace slot
+            if old_key is not None and old_key != key:
+                if words[index + 3]:
+                    self.overwrites += 1
+                words[index + 2] = words[index]
+                words[index + 3] = data
+            elif (words[index + 3] and
+                    words[index + 2] ^ words[index + 3] == key):
+                words[index + 3] = 0
+        else:
+            index += 2
+            data = words[index + 1]
+            old_key = words[index] ^ data if data else None
+            if old_key is not None and old_key != key:
+                self.overwrites += 1
+            elif old_key == key and best_move is None:
+                best_move = self._unpack(data)[3]
+        data = self._pack(min(depth, 0xFF), flag, score, best_move)
+        words[index] = key ^ data
+        words[index + 1] = data
+
+    def _entry_count(self) -> int:
+        # counts the entries stored by every process, unlike the statistics
+        words = self._words
+        return sum(1 for i in range(1, len(words), 2) if words[i])
+
+    def _capacity(self) -> int:
+        return len(self._words) // 2
@@ -0,0 +1,98 @@
+from .HashTable import HashTable
+
+
+class TranspositionTable(HashTable):
+    """
+    Fixed size table of search results keyed by a position's zobrist key
+    (https://www.chessprogramming.org/Transposition_Table).
+
+    The table is split into buckets of two entries. The first entry keeps the
+    result searched to the greatest depth and the second is always replaced,
+    so deep results survive while recent shallow ones are still kept.
+
+    Entries are tuples of (depth, flag, score, best_move) where flag says
+    whether the score is exact or a lower/upper bound.
+
+    Methods:
+        TranspositionTable(size_mb: int) (constructor)
+        probe(key: int) - returns the entry for a key or None
+        store(key, depth, flag, score, best_move)
+        clear()
+        get_stats()
+    """
+    EXACT, LOWER_BOUND, UPPER_BOUND = 0, 1, 2
+    # rough number of bytes used by one entry, two list slots plus the key
+    # and the entry tuple
+    entry_size = 128
+    bucket_size = 2
+    # collisions are probes finding another position in the bucket
+    stat_names = ("probes", "hits", "collisions", "stores", "overwrites")
+
+    def __init__(self, size_mb=16):
+        """
+        Parameters:
+            int size_mb - memory budget for the table in megabytes
+        """
+        self.size_mb = size_mb
+        super().__init__(size_mb * 1024 * 1024)
+
+    def probe(self, key: int):
+        """
+        Returns the entry stored for a key or None
+
+        Parameters:
+            int key - zobrist key of the position
+        """
+        self.probes += 1
+        index = (key % self._bucket_count) * 2
+        keys = self._keys
+        if keys[index] == key:
+            self.hits += 1
+            return self._entries[index]
+        if keys[index + 1] == key:
+            self.hits += 1
+            return self._entries[index + 1]
+        if keys[index] is not None:
+            # the bucket holds other positions
+            self.collisions += 1
+        return None
+
+    def store(self, key: int, depth: int, flag: int, score: int, best_move):
+        """
+        Stores a search result, in the depth-preferred entry of its bucket if
+        it was searched at least as deep as the result already there (or is
+        the same position), otherwise in the always-replace entry.
+
+        Parameters:
+            int key - zobrist key of the position
+            int depth - depth the position was searched to
+            int flag - EXACT, LOWER_BOUND or UPPER_BOUND
+            int score - the score found by the search
+            best_move - the best move found, or None
+        """
+        self.stores += 1
+        index = (key % self._bucket_count) * 2
+        keys = self._keys
+        entries = self._entries
+        if (keys[index] is None or keys[index] == key or
+                entries[index][0] <= depth):
+            if keys[index] == key and best_move is None:
+                # keep the move from the last time the position was searched
+                best_move = entries[index][3]
+            # the old depth-preferred entry moves to the always-replace slot
+            if keys[index] is not None and keys[index] != key:
+                if keys[index + 1] is not None:
+                    self.overwrites += 1
+                keys[index + 1] = keys[index]
+                entries[index + 1] = entries[index]
+            elif keys[index + 1] == key:
+                keys[index + 1] = None
+                entries[index + 1] = None
+        else:
+            index += 1
+            if keys[index] is not None and keys[index] != key:
+                self.overwrites += 1
+            elif keys[index] == key and best_move is None:
+                best_move = entries[index][3]
+        keys[index] = key
+        entries[index] = (depth, flag, score, best_move)
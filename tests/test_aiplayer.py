@@ -0,0 +1,375 @@
+import threading
+import unittest
+
+from chess_game import Game, Move
+from chess_game.GameState import GameState
+from chess_game.MoveEncoding import MoveEncoding
+from chess_game.ai_player.AIPlayer import AIPlayer
+from chess_game.ai_player.BatchEvaluation import BatchEvaluation
+from chess_game.ai_player.Evaluation import Evaluation
+from chess_game.ai_player.MoveOrdering import MoveOrderer
+from chess_game.ai_player.ParallelSearch import ParallelSearch
+from chess_game.ai_player.PawnTable import PawnTable
+from chess_game.ai_player.SharedTranspositionTable import \
+    SharedTranspositionTable
+from chess_game.ai_player.TranspositionTable import TranspositionTable
+
+
+class TestAIPlayerMethods(unittest.TestCase):
+    def test_finds_mate_in_one(self):
+        """
+        Tests that the AIPlayer plays checkmate when it is available
+        """
+        player = AIPlayer("w")
+        game = Game.Game(player, None,
+                         fen_string="6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1")
+        move = player.get_next_move()
+        self.assertEqual(move.to_algebraic_notation(), "Ra1a8")
+
+    def test_quiescence(self):
+        """
+        Tests that the AIPlayer doesn't take a defended pawn with its queen
+        when the capture is on the last move it searches
+        """
+        player = AIPlayer("w", depth=1)
+        game = Game.Game(player, None,
+                         fen_string="4k3/8/4p3/3p4/8/8/8/3QK3 w - - 0 1")
+        move = player.get_next_move()
+        self.assertNotEqual(move.to_algebraic_notation(), "Qd1d5")
+
+    def test_quiescence_in_check(self):
+        """
+        Tests that the quiescence search doesn't stand pat in check, so a
+        mate on the last move searched is scored as mate
+        """
+        player = AIPlayer("w", depth=1)
+        game = Game.Game(player, None,
+                         fen_string="6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1")
+        move = player.get_next_move()
+        self.assertEqual(move.to_algebraic_notation(), "Ra1a8")
+        self.assertEqual(player.score, AIPlayer.MATE - 1)
+
+    def test_repetition_is_draw(self):
+        """
+        Tests that the search scores a position it has reached before as a
+        draw, even when one side is a queen up
+        """
+        player = AIPlayer("w", depth=2)
+        game = Game.Game(player, None,
+                         fen_string="4k3/8/8/8/8/8/3Q4/4K1N1 w - - 0 1")
+        gamestate = game.gamestate
+        for algebraic_move in ["Ng1f3", "Ke8f8", "Nf3g1", "Kf8e8"]:
+            game.make_move(algebraic_move)
+        player._start_search(None, None)
+        self.assertEqual(player.alphabeta(gamestate, 2, -AIPlayer.INFINITY,
+                                          AIPlayer.INFINITY, ply=1), 0)
+        self.assertGreater(player.alphabeta(gamestate, 2, -AIPlayer.INFINITY,
+                                            AIPlayer.INFINITY), 0)
+
+        # a worker process given the position as FEN also knows the earlier
+        # positions, so scores going back to one as a draw too
+        fen = gamestate.generate_fen(include_clocks=True)
+        loaded = GameState(fen_string=fen,
+                           hash_history=gamestate.repetition_history())
+        for algebraic_move in ["Ng1f3", "Ke8f8"]:
+            for gs in (gamestate, loaded):
+                gs.make_move(Move.BaseMove.from_algebraic_notation(
+                    gs, gs.player_to_play, algebraic_move))
+            self.assertEqual(loaded.repetitions(), gamestate.repetitions())
+            self.assertTrue(loaded.is_repetition())
+        gamestate.undo_move()
+        gamestate.undo_move()
+        code = MoveEncoding.encode_move(
+            Move.BaseMove.from_algebraic_notation(gamestate, "w", "Ng1f3"))
+        search = ParallelSearch(AIPlayer, 1)
+        try:
+            (move, score, nodes), = search.search_root(
+                gamestate, [code], 2, -AIPlayer.INFINITY, AIPlayer.INFINITY)
+        finally:
+            search.close()
+        self.assertEqual(score, 0)
+
+    def test_parallel_search(self):
+        """
+        Tests that searching the root moves in worker processes finds the
+        same score as searching them in one process
+        """
+        fen_string = "r1bqkbnr/pppp1ppp/2n5/4p3/2B1P3/5N2/PPPP1PPP/RNBQK2R b KQkq - 3 3"
+        serial = AIPlayer("b", depth=3)
+        Game.Game(None, serial, fen_string=fen_string)
+        parallel = AIPlayer("b", depth=3, workers=2)
+        Game.Game(None, parallel, fen_string=fen_string)
+        try:
+            move = parallel.get_next_move()
+        finally:
+            parallel.close()
+        self.assertEqual(move.to_algebraic_notation(),
+                         serial.get_next_move().to_algebraic_notation())
+        self.assertEqual(parallel.score, serial.score)
+        self.assertEqual(parallel.completed_depth, 3)
+
+    def test_node_limit(self):
+        """
+        Tests that the search stops at the node limit and still returns the
+        move from the last depth it finished
+        """
+        player = AIPlayer("w", depth=10, node_limit=500)
+        game = Game.Game(player, None)
+        move = player.get_next_move()
+        self.assertTrue(move)
+        self.assertTrue(1 <= player.completed_depth < 10)
+        self.assertLessEqual(player.nodes, 501)
+
+    def test_parallel_node_limit(self):
+        """
+        Tests that the workers of a parallel search share the node limit
+        rather than each being given all of it
+        """
+        player = AIPlayer("w", depth=10, node_limit=8000, workers=2)
+        Game.Game(player, None, fen_string="r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1")
+        try:
+            self.assertTrue(player.get_next_move())
+        finally:
+            player.close()
+        # each worker can go over by the nodes it hasn't added to the count
+        self.assertLessEqual(
+            player.nodes, 8001 + 2 * AIPlayer.shared_check_interval)
+
+    def test_lazy_smp_node_limit(self):
+        """
+        Tests that the helpers of a Lazy SMP search share the node limit with
+        the main search rather than each being given all of it
+        """
+        player = AIPlayer("w", depth=10, node_limit=8000, workers=2,
+                          parallel_mode="lazy_smp")
+        Game.Game(player, None, fen_string="r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1")
+        try:
+            self.assertTrue(player.get_next_move())
+        finally:
+            player.close()
+        self.assertLessEqual(
+            player.nodes, 8001 + 2 * AIPlayer.shared_check_interval)
+
+    def test_stop(self):
+        """
+        Tests that a search can be stopped from another thread
+        """
+        player = AIPlayer("w", depth=50)
+        game = Game.Game(player, None)
+        result = []
+        thread = threading.Thread(
+            target=lambda: result.append(player.get_next_move()))
+        thread.start()
+        thread.join(0.5)
+        player.stop()
+        thread.join(10)
+        self.assertFalse(thread.is_alive())
+        self.assertTrue(result[0])
+
+    def test_transposition_table(self):
+        """
+        Tests storing and probing the transposition table, including the
+        depth-preferred and always-replace entries of a bucket
+        """
+        table = TranspositionTable(size_mb=1)
+        buckets = table._bucket_count
+        table.store(1, 4, TranspositionTable.EXACT, 10, 100)
+        # same bucket, shallower so goes in the always-replace entry
+        table.store(1 + buckets, 2, TranspositionTable.LOWER_BOUND, 5, 200)
+        self.assertEqual(table.probe(1), (4, TranspositionTable.EXACT, 10, 100))
+        self.assertEqual(table.probe(1 + buckets)[3], 200)
+
+        # replaces the always-replace entry
+        table.store(1 + 2 * buckets, 1, TranspositionTable.EXACT, 0, 300)
+        self.assertIsNone(table.probe(1 + buckets))
+        self.assertEqual(table.probe(1)[3], 100)
+        self.assertEqual(table.get_stats()["hits"], 3)
+        self.assertEqual(table.get_stats()["collisions"], 1)
+
+    def test_move_ordering(self):
+        """
+        Tests that the hash move comes first, then captures by MVV-LVA, then
+        killers and then quiet moves by history score
+        """
+        game = Game.Game(None, None,
+                         fen_string="4k3/8/1q1r4/2P5/8/8/8/3QK1N1 w - - 0 1")
+        gamestate = game.gamestate
+        codes = {MoveEncoding.to_algebraic_notation(gamestate, code): code
+                 for code in gamestate.get_legal_move_codes("W")}
+        orderer = MoveOrderer()
+        orderer.killers[0][0] = codes["Ng1f3"]
+        orderer.history[codes["Ke1f2"] & 4095] = 50
+        ordered = [MoveEncoding.to_algebraic_notation(gamestate, code)
+                   for code in orderer.order_moves(
+                       gamestate, list(codes.values()), 0, codes["Ng1h3"])]
+        self.assertEqual(ordered[:6], ["Ng1h3", "Pc5b6", "Pc5d6", "Qd1d6",
+                                       "Ng1f3", "Ke1f2"])
+
+        orderer.record_cutoff(gamestate, codes["Qd1d2"], 3, 1, 0)
+        self.assertEqual(orderer.killers[1][0], codes["Qd1d2"])
+        # captures aren't killers
+        orderer.record_cutoff(gamestate, codes["Qd1d6"], 3, 1, 1)
+        self.assertEqual(orderer.killers[1][0], codes["Qd1d2"])
+        self.assertEqual(orderer.first_move_cutoff_rate, 0.5)
+
+    def test_staged_moves(self):
+        """
+        Tests that the staged moves are the legal moves in the same order as
+        order_moves, and that an illegal hash or killer move is left out
+        """
+        game = Game.Game(None, None,
+                         fen_string="4k3/8/1q1r4/2P5/8/8/8/3QK1N1 w - - 0 1")
+        gamestate = game.gamestate
+        codes = {MoveEncoding.to_algebraic_notation(gamestate, code): code
+                 for code in gamestate.get_legal_move_codes("W")}
+        orderer = MoveOrderer()
+        orderer.killers[0][0] = codes["Ng1f3"]
+        orderer.history[codes["Ke1f2"] & 4095] = 50
+        staged = list(orderer.staged_moves(gamestate, 0, codes["Ng1h3"]))
+        self.assertEqual(staged, orderer.order_moves(
+            gamestate, list(codes.values()), 0, codes["Ng1h3"]))
+
+        # a hash move and a killer from other positions
+        hash_move = MoveEncoding.encode(0, 8)
+        orderer.killers[0][1] = MoveEncoding.encode(60, 51)
+        staged = list(orderer.staged_moves(gamestate, 0, hash_move))
+        self.assertEqual(sorted(staged), sorted(codes.values()))
+        self.assertEqual(staged[0], codes["Pc5b6"])
+
+    def test_losing_captures_last(self):
+        """
+        Tests that a capture losing material by static exchange evaluation
+        is ordered after the quiet moves and left out of the quiescence
+        search's captures
+        """
+        game = Game.Game(None, None,
+                         fen_string="4k3/4r3/8/4p3/8/8/4R3/4K3 w - - 0 1")
+        gamestate = game.gamestate
+        codes = {MoveEncoding.to_algebraic_notation(gamestate, code): code
+                 for code in gamestate.get_legal_move_codes("W")}
+        orderer = MoveOrderer()
+        ordered = orderer.order_moves(gamestate, list(codes.values()), 0)
+        self.assertEqual(ordered[-1], codes["Re2e5"])
+        self.assertEqual(list(orderer.staged_moves(gamestate, 0)), ordered)
+        self.assertEqual(orderer.order_captures(
+            gamestate, gamestate.get_capture_codes("W"), 0), [])
+
+    def test_search_cutoff_stats(self):
+        """
+        Tests that the search records its cutoffs
+        """
+        player = AIPlayer("w", depth=3)
+        game = Game.Game(player, None)
+        player.get_next_move()
+        self.assertGreater(player.move_orderer.cutoffs, 0)
+        self.assertGreater(player.move_orderer.first_move_cutoff_rate, 0.5)
+
+    def test_shared_transposition_table(self):
+        """
+        Tests that entries stored through one handle on a shared table can be
+        read through another, and that a half written entry is ignored
+        """
+        table = SharedTranspositionTable(size_mb=1)
+        other = SharedTranspositionTable(size_mb=1, name=table.name)
+        try:
+            table.store(12345, 3, TranspositionTable.LOWER_BOUND, -250, 1100)
+            table.store(999, 2, TranspositionTable.EXACT,
+                        -AIPlayer.MATE + 3, None)
+            self.assertEqual(other.probe(12345),
+                             (3, TranspositionTable.LOWER_BOUND, -250, 1100))
+            self.assertEqual(other.probe(999), (2, TranspositionTable.EXACT,
+                                                -AIPlayer.MATE + 3, None))
+
+            # change the data word without the key word to it
+            index = (12345 % table._bucket_count) * 4
+            table._words[index + 1] ^= 1 << 20
+            self.assertIsNone(other.probe(12345))
+        finally:
+            other.close()
+            table.close()
+
+    def test_lazy_smp(self):
+        """
+        Tests that a Lazy SMP search plays a legal move and that its helpers
+        fill the shared table, which is kept for the next move
+        """
+        player = AIPlayer("w", depth=3, workers=2, parallel_mode="lazy_smp")
+        game = Game.Game(player, None)
+        try:
+            move = player.get_next_move()
+            self.assertIn(move.to_algebraic_notation(),
+                          [m.to_algebraic_notation() for m in
+                           game.gamestate.get_legal_moves("w")])
+            self.assertEqual(player.completed_depth, 3)
+            self.assertGreater(
+                player.transposition_table.get_stats()["entries"], 0)
+            start_key = game.gamestate.zobrist_key
+            game.gamestate.make_move(move)
+            game.gamestate.make_move(game.gamestate.get_legal_moves("b")[0])
+            player.get_next_move()
+            self.assertTrue(player.transposition_table.probe(start_key))
+        finally:
+            player.close()
+
+    def test_pawn_structure(self):
+        """
+        Tests the doubled, isolated and passed pawn terms, and that they are
+        cached by pawn key with hit statistics
+        """
+        # white has doubled isolated pawns on the c file, black isolated
+        # pawns on d6 and h3, h3 is also passed
+        game = Game.Game(None, None,
+                         fen_string="4k3/8/3p4/8/2P5/2P4p/8/4K3 w - - 0 1")
+        gamestate = game.gamestate
+        bitboards = gamestate._bitboards
+        doubled = Evaluation.doubled_penalty
+        passed = Evaluation.passed_bonus[5]
+        self.assertEqual(
+            Evaluation.pawn_structure(bitboards[0], bitboards[6]),
+            (-doubled[0] - passed[0], -doubled[1] - passed[1]))
+
+        table = PawnTable(size_kb=1)
+        self.assertEqual(Evaluation.evaluate(gamestate, table),
+                         Evaluation.evaluate(gamestate))
+        # the king moving keeps the same pawns
+        game.make_move("Ke1d1")
+        self.assertEqual(Evaluation.evaluate(gamestate, table),
+                         Evaluation.evaluate(gamestate))
+        self.assertEqual(table.get_stats()["hits"], 1)
+        self.assertEqual(table.get_stats()["stores"], 1)
+        self.assertEqual(table.hit_rate, 0.5)
+
+    @unittest.skipIf(not BatchEvaluation.available(), "numpy not installed")
+    def test_batch_evaluation(self):
+        """
+        Tests that batch evaluation gives the same scores as the incremental
+        evaluation in both tensor layouts, from FEN strings and GameStates
+        """
+        fen_strings = [
+            "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+            "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+            "7k/8/8/8/3K4/8/P7/8 w - - 0 1",
+            "1QQQQQQk/8/8/8/8/8/8/K7 w - - 0 1"]
+        gamestates = [Game.Game(None, None, fen_string=fen).gamestate
+                      for fen in fen_strings]
+        scores = [gamestate.score for gamestate in gamestates]
+        boards = BatchEvaluation.to_boards(fen_strings)
+        self.assertEqual(boards.shape, (4, 64))
+        self.assertEqual(list(BatchEvaluation.evaluate(boards)), scores)
+        planes = BatchEvaluation.to_planes(gamestates)
+        self.assertEqual(planes.shape, (4, 12, 64))
+        self.assertEqual(list(BatchEvaluation.evaluate(planes)), scores)
+
+        gamestate = gamestates[1]
+        codes = gamestate.get_legal_move_codes("W", get_underpromotions=True)
+        expected = []
+        for code in codes:
+            gamestate.make_move_code(code)
+            expected.append(gamestate.score)
+            gamestate.undo_move()
+        self.assertEqual(
+            list(BatchEvaluation.evaluate_moves(gamestate, codes)), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
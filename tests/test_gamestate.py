@@ -1,6 +1,10 @@
 import unittest
 
 from chess_game import GameState, Move
+from chess_game.Bitboard import Bitboard
+from chess_game.MoveEncoding import MoveEncoding
+from chess_game.Zobrist import Zobrist
+from chess_game.ai_player.Evaluation import Evaluation
 
 
 class TestGameStateMethods(unittest.TestCase):
@@ -45,6 +49,375 @@ class TestGameStateMethods(unittest.TestCase):
         checkmate = gs.checkmate("w")
         self.assertTrue(checkmate)
 
+    def test_get_status(self):
+        """
+        Tests the status of the side to move, and that it is worked out again
+        once a move is made or undone
+        """
+        gs = GameState.GameState(fen_string="7k/8/6Q1/8/8/8/8/K7 w - - 0 1")
+        self.assertEqual(gs.get_status(), (False, 26, ""))
+        self.assertIs(gs.get_status(), gs.get_status())
+
+        gs.make_move(Move.BaseMove.from_algebraic_notation(gs, "w", "Qg6f7"))
+        self.assertEqual(gs.get_status(), (False, 0, "stalemate"))
+        self.assertTrue(gs.stalemate())
+        gs.undo_move()
+        gs.make_move(Move.BaseMove.from_algebraic_notation(gs, "w", "Qg6g7"))
+        self.assertEqual(gs.get_status(), (True, 1, ""))
+        gs.undo_move()
+        self.assertEqual(gs.get_status(), (False, 26, ""))
+
+    def test_legal_move_cache(self):
+        """
+        Tests that the legal moves are generated once per position, indexed
+        by square, kept when a reply is made and undone, and generated again
+        once they are asked for in another position
+        """
+        gs = GameState.GameState()
+        codes = gs._legal_move_index("w")[0]
+        self.assertIs(gs._legal_move_index("w")[0], codes)
+        self.assertEqual(
+            sorted(code >> 6 & 63 for code in gs.legal_moves_from((6, 7))),
+            [45, 47])
+        self.assertEqual(len(gs.legal_moves_to((4, 4))), 1)
+        self.assertEqual(gs.legal_moves_from((4, 4)), [])
+
+        gs.make_move(Move.BaseMove.from_algebraic_notation(gs, "w", "e4"))
+        self.assertEqual(len(gs.legal_moves_from((4, 1))), 2)
+        gs.undo_move()
+        self.assertIs(gs._legal_move_index("w")[0], codes)
+
+        gs.make_move(Move.BaseMove.from_algebraic_notation(gs, "w", "e4"))
+        self.assertEqual(len(gs.legal_moves_from((4, 4), "w")), 1)
+        gs.undo_move()
+        self.assertIsNot(gs._legal_move_index("w")[0], codes)
+        self.assertEqual(list(gs._legal_move_index("w")[0]), list(codes))
+
+    def test_draw_by_rule(self):
+        """
+        Tests threefold repetition and the fifty move rule, and that the
+        halfmove clock is read from and written to FEN
+        """
+        gs = GameState.GameState(fen_string="4k3/8/8/8/8/8/4P3/4K1N1 w - - 0 1")
+        shuffle = ["Ng1f3", "Ke8d8", "Nf3g1", "Kd8e8"]
+        for i in range(2):
+            for algebraic_move in shuffle:
+                self.assertEqual(gs.get_status()[2], "")
+                gs.make_move(Move.BaseMove.from_algebraic_notation(
+                    gs, gs.player_to_play, algebraic_move))
+            self.assertEqual(gs.repetitions(), i + 1)
+        self.assertEqual(gs.get_status()[2], "threefold_repetition")
+        self.assertEqual(gs.halfmove_clock, 8)
+        self.assertEqual(gs.generate_fen(include_clocks=True),
+                         "4k3/8/8/8/8/8/4P3/4K1N1 w - - 8 5")
+
+        # a pawn move means no earlier position can be repeated
+        gs.make_move(Move.BaseMove.from_algebraic_notation(gs, "w", "e4"))
+        self.assertEqual(gs.halfmove_clock, 0)
+        self.assertFalse(gs.is_repetition())
+        gs.undo_move()
+        self.assertEqual(gs.halfmove_clock, 8)
+        self.assertTrue(gs.is_repetition())
+
+        gs = GameState.GameState(
+            fen_string="4k3/8/8/8/8/8/4P3/4K1N1 w - - 99 80")
+        self.assertEqual(gs.get_status()[2], "")
+        gs.make_move(Move.BaseMove.from_algebraic_notation(gs, "w", "Ng1f3"))
+        self.assertEqual(gs.get_status()[2], "fifty_move_rule")
+
+    def test_bitboards(self):
+        """
+        Tests that the bitboards agree with the squares after moves are made
+        """
+        gs = GameState.GameState()
+        for algebraic_move, colour in [("e4", "w"), ("d5", "b"), ("ed5", "w")]:
+            gs.make_move(Move.BaseMove.from_algebraic_notation(
+                gs, colour, algebraic_move))
+
+        bitboards = [0] * 12
+        for square in gs._squares:
+            if not square.is_empty():
+                bitboards[square.get_piece().bitboard_index] |= (
+                    1 << square._index)
+        self.assertEqual(bitboards, gs._bitboards)
+        self.assertEqual(gs.get_bitboard("P"), 0x00EF000008000000)
+        self.assertTrue(gs.square_is_empty((4, 6)))
+        self.assertFalse(gs.square_is_empty((3, 3)))
+
+    def test_piece_lists(self):
+        """
+        Tests that the piece lists and king squares agree with the squares
+        after moves, including castling, are made and undone
+        """
+        def assert_matches_squares(gs):
+            for colour in "wb":
+                on_squares = [s.get_piece() for s in gs._squares
+                              if not s.is_empty() and
+                              s.get_piece().colour == colour]
+                self.assertCountEqual(gs.get_pieces_by_colour(colour),
+                                      on_squares)
+                king = [p for p in on_squares if p.letter.upper() == "K"][0]
+                self.assertEqual(
+                    gs.king_square(colour),
+                    king.position[0] + 8 * king.position[1])
+
+        gs = GameState.GameState(
+            fen_string="r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1")
+        for code in gs.get_legal_move_codes("W"):
+            gs.make_move_code(code)
+            assert_matches_squares(gs)
+            gs.undo_move()
+        assert_matches_squares(gs)
+        self.assertEqual(len(gs.get_pieces("w", Bitboard.PAWN)), 8)
+        self.assertEqual(gs.king_square("b"), 4)
+
+    def test_incremental_score(self):
+        """
+        Tests that the running score agrees with the evaluation worked out
+        from scratch after moves, including promotions, en passant and
+        castling, are made and undone
+        """
+        def from_scratch(gs):
+            return (Evaluation.total_material_value(gs) +
+                    Evaluation.total_position_value(gs))
+
+        gs = GameState.GameState(
+            fen_string="r3k2r/1P6/8/3pP3/8/8/8/R3K2R w KQkq d6 0 1")
+        self.assertEqual(gs.score, from_scratch(gs))
+        for code in gs.get_legal_move_codes("W", get_underpromotions=True):
+            gs.make_move_code(code)
+            self.assertEqual(gs.score, from_scratch(gs))
+            self.assertEqual(gs.clone().score, gs.score)
+            gs.undo_move()
+        self.assertEqual(gs.score, from_scratch(gs))
+
+    def test_pawn_key(self):
+        """
+        Tests that the pawn key agrees with the key worked out from scratch
+        after moves are made and undone, and only changes when pawns do
+        """
+        gs = GameState.GameState(
+            fen_string="r3k2r/1P6/8/3pP3/8/8/8/R3K2R w KQkq d6 0 1")
+        key = gs.pawn_key
+        self.assertEqual(key, Zobrist.pawn_hash(gs))
+        for code in gs.get_legal_move_codes("W", get_underpromotions=True):
+            gs.make_move_code(code)
+            self.assertEqual(gs.pawn_key, Zobrist.pawn_hash(gs))
+            # only the pawns on b7 and e5 change the key
+            if MoveEncoding.from_square(code) in (9, 28):
+                self.assertNotEqual(gs.pawn_key, key)
+            else:
+                self.assertEqual(gs.pawn_key, key)
+            gs.undo_move()
+        self.assertEqual(gs.pawn_key, key)
+
+    def test_see(self):
+        """
+        Tests static exchange evaluation of captures, including x-ray
+        attackers behind the first attacker and en passant, and that the
+        board is left as it was
+        """
+        def see(fen_string, algebraic_move):
+            gs = GameState.GameState(fen_string=fen_string)
+            fen = gs.generate_fen()
+            for code in gs.get_legal_move_codes(gs.player_to_play,
+                                                get_underpromotions=True):
+                if MoveEncoding.to_algebraic_notation(gs, code) == \
+                        algebraic_move:
+                    value = gs.see(code)
+                    self.assertEqual(gs.generate_fen(), fen)
+                    return value
+
+        values = GameState.GameState.see_values
+        pawn = values[Bitboard.PAWN]
+        knight = values[Bitboard.KNIGHT]
+        rook = values[Bitboard.ROOK]
+        self.assertEqual(see("1k1r4/1pp4p/p7/4p3/8/P5P1/1PP4P/2K1R3 w - - 0 1",
+                             "Re1e5"), pawn)
+        # the rook and queen behind the knight and bishop join in
+        self.assertEqual(see(
+            "1k1r3q/1ppn3p/p4b2/4p3/8/P2N2P1/1PP1R1BP/2K1Q3 w - - 0 1",
+            "Nd3e5"), pawn - knight)
+        self.assertEqual(see("4k3/4r3/8/4p3/8/8/4R3/4K3 w - - 0 1",
+                             "Re2e5"), pawn - rook)
+        self.assertEqual(see("4k3/8/8/3pP3/8/8/8/4K3 w - d6 0 1",
+                             "Pe5d6"), pawn)
+        # promoting where the queen is taken loses the pawn
+        self.assertEqual(see("3rk3/1P6/8/8/8/8/8/4K3 w - - 0 1",
+                             "Pb7b8=Q"), -pawn)
+
+    def test_score_mirrored_and_tapered(self):
+        """
+        Tests that the same position with the colours swapped scores the
+        opposite, and that the endgame king table takes over as pieces come
+        off
+        """
+        self.assertEqual(GameState.GameState().score, 0)
+        gs = GameState.GameState(
+            fen_string="r3k2r/1P6/8/3pP3/8/8/8/R3K2R w KQkq d6 0 1")
+        mirrored = GameState.GameState(
+            fen_string="r3k2r/8/8/8/3Pp3/8/1p6/R3K2R b KQkq d3 0 1")
+        self.assertEqual(gs.score, -mirrored.score)
+
+        # with only kings and pawns left a central king is better
+        corner = GameState.GameState(fen_string="7k/8/8/8/8/8/P7/K7 w - - 0 1")
+        centre = GameState.GameState(fen_string="7k/8/8/8/3K4/8/P7/8 w - - 0 1")
+        self.assertGreater(centre.score, corner.score)
+        self.assertEqual(
+            centre.score - corner.score,
+            Evaluation.eg_values[5 * 64 + 35] - Evaluation.eg_values[5 * 64 + 56])
+
+    def test_undo_move(self):
+        """
+        Tests that undo_move restores the position exactly, including en
+        passant captures and promotions
+        """
+        gs = GameState.GameState(
+            fen_string="4k3/1P6/8/8/3p4/8/4P3/4K3 w - - 0 1")
+        fen = gs.generate_fen()
+        bitboards = list(gs._bitboards)
+        for algebraic_move, colour in [("e4", "w"), ("de3", "b"),
+                                       ("b8=Q", "w")]:
+            gs.make_move(Move.BaseMove.from_algebraic_notation(
+                gs, colour, algebraic_move))
+        self.assertEqual(gs.generate_fen(), "1Q2k3/8/8/8/8/4p3/8/4K3 b - -")
+
+        for i in range(3):
+            gs.undo_move()
+        self.assertEqual(gs.generate_fen(), fen)
+        self.assertEqual(gs._bitboards, bitboards)
+        self.assertEqual(gs.get_square((4, 6)).get_piece().move_count, 0)
+        self.assertEqual(gs.ply_count, 0)
+
+    def test_undo_move_on_clone(self):
+        """
+        Tests that undoing moves made as codes on a clone leaves the original
+        position and its pieces unchanged
+        """
+        gs = GameState.GameState(
+            fen_string="rnbqkbnr/ppp1pppp/8/3p4/4P3/8/PPPP1PPP/RNBQKBNR w KQkq"
+                       " - 0 2")
+        # exd5 then Qxd5
+        gs.make_move_code(MoveEncoding.encode(36, 27, MoveEncoding.CAPTURE))
+        gs.make_move_code(MoveEncoding.encode(3, 27, MoveEncoding.CAPTURE))
+        fen = gs.generate_fen()
+
+        copy = gs.clone()
+        copy.undo_move()
+        copy.undo_move()
+        self.assertEqual(copy.generate_fen(), "rnbqkbnr/ppp1pppp/8/3p4/4P3/8/"
+                                              "PPPP1PPP/RNBQKBNR w KQkq -")
+        self.assertEqual(gs.generate_fen(), fen)
+        for square in gs._squares:
+            piece = square.get_piece()
+            if piece:
+                self.assertEqual(piece.position, square.position)
+                self.assertIsNot(piece, copy.get_square(
+                    square.position).get_piece())
+
+    def test_pinned_piece(self):
+        """
+        Tests that a piece pinned to the king can only move along the pin
+        """
+        gs = GameState.GameState(fen_string="4k3/4r3/8/8/8/8/4R3/B3K3 w - - 0 1")
+        moves = [(m.position_from, m.position_to)
+                 for m in gs.get_legal_moves("w") if m.position_from == (4, 6)]
+        self.assertEqual(
+            sorted(moves), [((4, 6), (4, y)) for y in range(1, 6)])
+
+    def test_en_passant_discovered_check(self):
+        """
+        Tests that en passant is not legal when removing both pawns from the
+        rank would put the king in check
+        """
+        def en_passant_moves(fen_string):
+            gs = GameState.GameState(fen_string=fen_string)
+            gs.make_move(Move.BaseMove.from_algebraic_notation(gs, "b", "c5"))
+            return [m for m in gs.get_legal_moves("w")
+                    if m.normal and m.en_passant]
+
+        self.assertEqual(len(en_passant_moves("8/2p5/8/KP6/8/8/8/7k w")), 1)
+        self.assertEqual(len(en_passant_moves("8/2p5/8/KP5r/8/8/8/7k w")), 0)
+
+    def test_is_square_attacked(self):
+        """
+        Tests is_square_attacked for each type of piece, including sliding
+        pieces that are blocked
+        """
+        gs = GameState.GameState(
+            fen_string="4k3/8/3p4/8/1N2Q3/8/8/R3K3 w - - 0 1")
+        self.assertTrue(gs.is_square_attacked((2, 2), "w"))  # knight
+        self.assertTrue(gs.is_square_attacked((4, 3), "b"))  # pawn
+        self.assertTrue(gs.is_square_attacked((3, 7), "w"))  # rook & king
+        self.assertTrue(gs.is_square_attacked((7, 1), "w"))  # queen
+        self.assertFalse(gs.is_square_attacked((2, 1), "w"))  # blocked
+        self.assertFalse(gs.is_square_attacked((5, 2), "w"))
+
+    def test_attack_tables(self):
+        """
+        Tests that the precomputed attack tables agree with the shifted
+        bitboard attacks for a piece on each square
+        """
+        occupied = 0x00FF00A000001800
+        for square in range(64):
+            bb = 1 << square
+            self.assertEqual(Bitboard.knight_table[square],
+                             Bitboard.knight_attacks(bb))
+            self.assertEqual(Bitboard.king_table[square],
+                             Bitboard.king_attacks(bb))
+            self.assertEqual(Bitboard.pawn_table[1][square],
+                             Bitboard.pawn_attacks(bb, 1))
+            self.assertEqual(Bitboard.rook_attacks_from(square, occupied),
+                             Bitboard.rook_attacks(bb, occupied))
+            self.assertEqual(Bitboard.bishop_attacks_from(square, occupied),
+                             Bitboard.bishop_attacks(bb, occupied))
+
+    def test_get_captures(self):
+        """
+        Tests that only captures (including en passant) and promotions are
+        generated by get_captures
+        """
+        gs = GameState.GameState(
+            fen_string="1n2k3/P7/8/3pP3/8/8/8/3QK3 w - d6 0 1")
+        moves = sorted(m.to_algebraic_notation() for m in gs.get_captures("w"))
+        self.assertEqual(moves, ["Pa7a8=Q", "Pa7b8=Q", "Pe5d6", "Qd1d5"])
+
+    def test_zobrist_key(self):
+        """
+        Tests that the zobrist key is the same for the same position reached
+        by different move orders, and is restored when moves are undone
+        """
+        def play(algebraic_moves):
+            gs = GameState.GameState()
+            colour = "w"
+            for algebraic_move in algebraic_moves:
+                gs.make_move(Move.BaseMove.from_algebraic_notation(
+                    gs, colour, algebraic_move))
+                colour = "b" if colour == "w" else "w"
+            return gs
+
+        gs = play(["Ng1f3", "Ng8f6", "Nb1c3"])
+        self.assertEqual(gs.zobrist_key,
+                         play(["Nb1c3", "Ng8f6", "Ng1f3"]).zobrist_key)
+        self.assertNotEqual(gs.zobrist_key,
+                            play(["Nb1c3", "Ng8f6"]).zobrist_key)
+        self.assertEqual(gs.zobrist_key,
+                         GameState.GameState(gs.generate_fen()).zobrist_key)
+
+        for i in range(3):
+            gs.undo_move()
+        self.assertEqual(gs.zobrist_key, GameState.GameState().zobrist_key)
+
+        # an en passant square in FEN is only kept if a pawn can take there,
+        # the same as when the pawn push is played
+        gs = play(["e4"])
+        loaded = GameState.GameState(
+            "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1")
+        self.assertIsNone(loaded.en_passant)
+        self.assertEqual(loaded.zobrist_key, gs.zobrist_key)
+        loaded = GameState.GameState("4k3/8/8/3pP3/8/8/8/4K3 w - d6 0 1")
+        self.assertEqual(loaded.en_passant, (3, 2))
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -1,5 +1,8 @@
+import subprocess
+import sys
 import unittest
 from chess_game import Move, GameState
+from chess_game.MoveEncoding import MoveEncoding
 
 
 class TestMoveMethods(unittest.TestCase):
@@ -37,6 +40,40 @@ class TestMoveMethods(unittest.TestCase):
         self.assertTrue(mv and mv.normal and mv.position_from ==
                         (0, 1) and mv.position_to == (3, 1))
 
+    def test_from_algebraic_notation_promotion(self):
+        """
+        Tests Move.from_algebraic_notation() for promotions, the piece
+        promoted to is kept
+        """
+        gs = GameState.GameState(fen_string="1n2k3/P7/8/8/8/8/8/4K3 w - - 0 1")
+        mv = Move.Move.from_algebraic_notation(gs, "w", "axb8=N")
+        self.assertEqual(mv.to_algebraic_notation(), "Pa7b8=N")
+        mv = Move.Move.from_algebraic_notation(gs, "w", "Pa7a8=Q")
+        self.assertEqual(mv.to_algebraic_notation(), "Pa7a8=Q")
+        self.assertIsNone(Move.Move.from_algebraic_notation(gs, "w", "a8=K"))
+
+    def test_from_algebraic_notation_list(self):
+        """
+        Tests parsing a list of moves, each against the position after the
+        moves before it
+        """
+        gs = GameState.GameState()
+        fen = gs.generate_fen()
+        moves = Move.BaseMove.from_algebraic_notation_list(
+            gs, ["e4", "e5", "Nf3", "Nc6", "Bb5", "a6", "O-O"],
+            keep_moves=False)
+        self.assertEqual([mv.to_algebraic_notation() for mv in moves],
+                         ["Pe2e4", "Pe7e5", "Ng1f3", "Nb8c6", "Bf1b5",
+                          "Pa7a6", "O-O"])
+        self.assertEqual(gs.generate_fen(), fen)
+
+        Move.BaseMove.from_algebraic_notation_list(gs, ["d4", "d5"])
+        self.assertEqual(gs.ply_count, 2)
+        # an illegal move leaves the gamestate as it was
+        with self.assertRaises(Exception):
+            Move.BaseMove.from_algebraic_notation_list(gs, ["c4", "Ke6"])
+        self.assertEqual(gs.ply_count, 2)
+
     def test_to_algebraic_notation_promotion(self):
         """
         Tests PromotionMove.to_algebraic_notation()
@@ -82,3 +119,55 @@ class TestMoveMethods(unittest.TestCase):
         other_formated_mvs = [move_to_str(mv)
                               for mv in gs.get_legal_moves("w")]
         self.assertTrue(formated_mvs == other_formated_mvs)
+
+    def test_move_encoding(self):
+        """
+        Tests that encoded moves decode to the same moves and encode back to
+        the same codes, for each kind of move
+        """
+        gs = GameState.GameState(
+            fen_string="r3k2r/1P6/8/3pP3/8/8/8/R3K2R w KQkq d6 0 1")
+        codes = gs.get_legal_move_codes("w", get_underpromotions=True)
+        moves = [MoveEncoding.decode(gs, code) for code in codes]
+        self.assertEqual([MoveEncoding.encode_move(mv) for mv in moves],
+                         list(codes))
+        notations = [mv.to_algebraic_notation() for mv in moves]
+        for notation in ["O-O", "O-O-O", "Pe5d6", "Pb7a8=Q", "Pb7a8=N",
+                         "Pb7b8=R", "Ra1a8"]:
+            self.assertIn(notation, notations)
+
+        flags = {notation: MoveEncoding.flags(code)
+                 for notation, code in zip(notations, codes)}
+        self.assertEqual(flags["O-O"], MoveEncoding.KING_CASTLE)
+        self.assertEqual(flags["Pe5d6"], MoveEncoding.EN_PASSANT)
+        self.assertTrue(MoveEncoding.is_capture(
+            codes[notations.index("Pb7a8=N")]))
+        self.assertEqual(flags["Ra1a8"], MoveEncoding.CAPTURE)
+
+    def test_make_move_code(self):
+        """
+        Tests that making and undoing encoded moves leaves the same position
+        as making the equivalent Move objects
+        """
+        gs = GameState.GameState(
+            fen_string="r3k2r/1P6/8/3pP3/8/8/8/R3K2R w KQkq d6 0 1")
+        fen = gs.generate_fen()
+        for code in gs.get_legal_move_codes("w", get_underpromotions=True):
+            other = GameState.GameState(fen_string=fen)
+            other.make_move(MoveEncoding.decode(other, code),
+                            check_legality=False)
+            gs.make_move_code(code)
+            self.assertEqual(gs.generate_fen(), other.generate_fen())
+            self.assertEqual(gs.zobrist_key, other.zobrist_key)
+            self.assertEqual(gs.undo_move(), code)
+            self.assertEqual(gs.generate_fen(), fen)
+
+    def test_import_move_encoding_first(self):
+        """
+        Tests that MoveEncoding and MoveGenerator can be the first modules
+        imported
+        """
+        for module in ["chess_game.MoveEncoding", "chess_game.MoveGenerator"]:
+            result = subprocess.run([sys.executable, "-c", f"import {module}"],
+                                    capture_output=True)
+            self.assertEqual(result.returncode, 0, result.stderr)
@@ -0,0 +1,35 @@
+import unittest
+
+from chess_game.GameState import GameState
+from chess_game.Perft import Perft
+
+
+class TestPerftMethods(unittest.TestCase):
+    def test_standard_positions(self):
+        """
+        Tests the move generator against the known perft counts for the
+        standard positions at shallow depths
+        """
+        for name, fen_string, counts in Perft.positions:
+            gamestate = GameState(fen_string=fen_string)
+            depth = 3 if counts[2] < 10000 else 2
+            for i in range(depth):
+                self.assertEqual(Perft.perft(gamestate, i + 1), counts[i],
+                                 f"{name} depth {i + 1}")
+            self.assertEqual(gamestate.generate_fen(),
+                             GameState(fen_string=fen_string).generate_fen())
+
+    def test_divide(self):
+        """
+        Tests that the divide counts add up to the perft count and are the
+        same when shared between processes
+        """
+        gamestate = GameState(fen_string=Perft.positions[3][1])
+        counts = Perft.divide(gamestate, 2)
+        self.assertEqual(len(counts), 6)
+        self.assertEqual(sum(counts.values()), 264)
+        self.assertEqual(Perft.divide(gamestate, 2, workers=2), counts)
+
+
+if __name__ == "__main__":
+    unittest.main()